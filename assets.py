@@ -0,0 +1,109 @@
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+MAX_ENTRIES = 64
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Work that is safe off the main thread; display conversion and font setup happen on fetch
+LOADERS = {
+    "image": pygame.image.load,
+    "bytes": read_bytes,
+    "sound": pygame.mixer.Sound,
+    "json": read_json,
+}
+
+
+class AssetManager:
+    def __init__(self, max_entries=MAX_ENTRIES, workers=4):
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def preload(self, kind, path):
+        key = (kind, path)
+        with self.lock:
+            if key in self.cache or key in self.pending:
+                return
+            self.pending[key] = self.executor.submit(LOADERS[kind], path)
+
+    def progress(self):
+        with self.lock:
+            if not self.pending:
+                return 1.0
+            done = sum(1 for future in self.pending.values() if future.done())
+            return done / len(self.pending)
+
+    def done(self):
+        return self.progress() >= 1.0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.cache[key] = value
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return value
+
+    def raw(self, kind, path):
+        key = (kind, path)
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self.lock:
+            future = self.pending.pop(key, None)
+        value = future.result() if future is not None else LOADERS[kind](path)
+        return self.put(key, value)
+
+    def image(self, path, size=None, alpha=False):
+        key = ("surface", path, size, alpha)
+        surface = self.get(key)
+        if surface is None:
+            surface = self.raw("image", path)
+            if size is not None:
+                surface = pygame.transform.scale(surface, size)
+            surface = self.put(key, surface.convert_alpha() if alpha else surface.convert())
+        return surface
+
+    def font(self, path, size):
+        key = ("font", path, size)
+        font = self.get(key)
+        if font is None:
+            font = self.put(key, pygame.font.Font(io.BytesIO(self.raw("bytes", path)), size))
+        return font
+
+    def sound(self, path):
+        return self.raw("sound", path)
+
+    def music(self, path):
+        # pygame streams music from a file object, so each load gets a fresh view of the cached bytes
+        return io.BytesIO(self.raw("bytes", path))
+
+    def theme(self, path):
+        return self.raw("json", path)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
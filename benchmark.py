@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+# The dummy drivers have to be selected before pygame is imported
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from menu import MainMenu, NameInputMenu, StatsWindow
+from puzzle_game import PuzzleGame
+from settings import SettingsMenu
+from scene_manager import FRAME_RATE, SceneManager
+from board import DIRECTIONS
+
+ARROW_KEYS = (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT)
+PERCENTILES = (50, 95, 99)
+# Differences below this many milliseconds are treated as timer noise
+NOISE_FLOOR = 0.05
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self.frame_start = None
+        self.last = None
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.frame_start = self.last
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.samples.setdefault(stage, []).append((now - self.last) * 1000.0)
+        self.last = now
+
+    def end_frame(self):
+        self.samples.setdefault("frame", []).append((self.last - self.frame_start) * 1000.0)
+
+    def summary(self):
+        return {stage: percentiles(values) for stage, values in self.samples.items()}
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    result = {}
+    for percentile in PERCENTILES:
+        index = min(len(ordered) - 1, max(0, int(round(percentile / 100.0 * len(ordered))) - 1))
+        result[f"p{percentile}"] = round(ordered[index], 4)
+    return result
+
+
+def write_config(base_config, rows, cols, star_count):
+    tree = ET.parse(base_config)
+    root = tree.getroot()
+    width = int(root.findtext("window_width", "800"))
+    height = int(root.findtext("window_height", "600"))
+    margin = int(root.findtext("grid_margin", "5"))
+    # Shrink tiles so larger boards still fit in the window
+    tile_size = max(8, min(100, min(width, height) // max(rows, cols) - margin))
+    values = {"rows": rows, "cols": cols, "star_count": star_count, "tile_size": tile_size,
+              "font_size": max(8, tile_size // 2)}
+    for tag, value in values.items():
+        element = root.find(tag)
+        if element is None:
+            element = ET.SubElement(root, tag)
+        element.text = str(value)
+    handle, path = tempfile.mkstemp(suffix=".xml")
+    os.close(handle)
+    tree.write(path)
+    return path
+
+
+def bench_game(base_config, rows, cols, star_count, frames, rng, directory):
+    config_path = write_config(base_config, rows, cols, star_count)
+    try:
+        scenes = SceneManager(config_path, os.path.join(directory, "statistics.db"))
+    finally:
+        os.remove(config_path)
+    game = PuzzleGame(scenes, "benchmark", pool_file=os.path.join(directory, "scrambles.pkl"), record=False)
+
+    timer = StageTimer()
+    for _ in range(frames):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=rng.choice(ARROW_KEYS)))
+        timer.start()
+        for event in pygame.event.get():
+            if event.type == pygame.KEYDOWN:
+                game.move_tile(DIRECTIONS[ARROW_KEYS.index(event.key)])
+        timer.mark("events")
+        game.update_stars(1.0 / FRAME_RATE)
+        timer.mark("update_stars")
+        game.draw_gradient_background()
+        timer.mark("draw_gradient_background")
+        game.draw_stars()
+        timer.mark("draw_stars")
+        game.draw_tiles()
+        timer.mark("draw_tiles")
+        pygame.display.update()
+        timer.mark("display.update")
+        timer.end_frame()
+
+    game.solver.shutdown()
+    game.scrambles.shutdown()
+    scenes.shutdown()
+    return timer.summary()
+
+
+def bench_screen(scenes, scene, frames, rng):
+    width, height = scene.width, scene.height
+    timer = StageTimer()
+    for _ in range(frames):
+        # Sweep the pointer over the window so hover states keep changing
+        position = (rng.randrange(width), rng.randrange(height))
+        pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, pos=position, rel=(0, 0), buttons=(0, 0, 0)))
+        timer.start()
+        for event in pygame.event.get():
+            scene.manager.process_events(event)
+        timer.mark("events")
+        scene.manager.update(1 / 60.0)
+        timer.mark("manager.update")
+        scene.draw(scenes.screen)
+        scene.manager.draw_ui(scenes.screen)
+        timer.mark("draw_ui")
+        pygame.display.update()
+        timer.mark("display.update")
+        timer.end_frame()
+    return timer.summary()
+
+
+def bench_menus(base_config, frames, rng, directory):
+    scenes = SceneManager(base_config, os.path.join(directory, "statistics.db"))
+    main_menu = MainMenu(scenes)
+    screens = {
+        "MainMenu": lambda: main_menu,
+        "NameInputMenu": lambda: NameInputMenu(main_menu),
+        "StatsWindow": lambda: StatsWindow(main_menu),
+        "SettingsMenu": lambda: SettingsMenu(scenes, main_menu.settings),
+    }
+    results = {}
+    for name, build in screens.items():
+        print(f"Running menu_{name}")
+        scene = build()
+        scene.enter()
+        results[name] = bench_screen(scenes, scene, frames, rng)
+    scenes.shutdown()
+    return results
+
+
+def parse_sizes(text):
+    sizes = []
+    for size in text.split(","):
+        rows, cols = size.lower().split("x")
+        sizes.append((int(rows), int(cols)))
+    return sizes
+
+
+def run_benchmarks(args):
+    rng = random.Random(args.seed)
+    scenarios = {}
+    # Statistics and scrambles go to a scratch directory and games record nothing, so a run
+    # leaves the player's files alone and never starts a generator process mid-measurement
+    with tempfile.TemporaryDirectory() as directory:
+        for rows, cols in parse_sizes(args.sizes):
+            for star_count in (int(count) for count in args.stars.split(",")):
+                name = f"game_{rows}x{cols}_stars{star_count}"
+                print(f"Running {name}")
+                scenarios[name] = bench_game(args.config, rows, cols, star_count, args.frames, rng, directory)
+        if not args.skip_menus:
+            for name, summary in bench_menus(args.config, args.frames, rng, directory).items():
+                scenarios[f"menu_{name}"] = summary
+    return {"frames": args.frames, "scenarios": scenarios}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for scenario, stages in results["scenarios"].items():
+        base_stages = baseline.get("scenarios", {}).get(scenario)
+        if base_stages is None:
+            continue
+        for stage, values in stages.items():
+            base_values = base_stages.get(stage)
+            if base_values is None:
+                continue
+            for key, value in values.items():
+                base_value = base_values.get(key)
+                if base_value is None:
+                    continue
+                if value > base_value * (1 + threshold) and value - base_value > NOISE_FLOOR:
+                    regressions.append((scenario, stage, key, base_value, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless frame-time benchmark for the game and menus")
+    parser.add_argument("--config", default="config.xml")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--sizes", default="3x3,4x4,8x8")
+    parser.add_argument("--stars", default="100,10000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-menus", action="store_true")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag stages slower than this stored result")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown as a fraction")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for scenario, stage, key, base_value, value in regressions:
+            print(f"REGRESSION {scenario} {stage} {key}: {base_value:.3f} ms -> {value:.3f} ms")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Directions name the way a tile slides into the empty cell, as in PuzzleGame.move_tile
+DIRECTIONS = ("up", "down", "left", "right")
+OPPOSITE = {"up": "down", "down": "up", "left": "right", "right": "left"}
+
+
+def blank_offset(direction, cols):
+    if direction == "up":
+        return cols
+    if direction == "down":
+        return -cols
+    if direction == "left":
+        return 1
+    return -1
+
+
+def can_move(direction, blank, rows, cols):
+    row, col = divmod(blank, cols)
+    if direction == "up":
+        return row < rows - 1
+    if direction == "down":
+        return row > 0
+    if direction == "left":
+        return col < cols - 1
+    return col > 0
+
+
+def goal_tiles(rows, cols):
+    return list(range(1, rows * cols)) + [0]
+
+
+def cell_bits(rows, cols):
+    # 4 bits per cell fits a 4x4 board in 64 bits; larger boards widen every cell
+    return max(4, (rows * cols - 1).bit_length())
+
+
+def pack(tiles, bits):
+    state = 0
+    for index, tile in enumerate(tiles):
+        state |= tile << (index * bits)
+    return state
+
+
+GOAL_STATES = {}
+
+
+def goal_state(rows, cols):
+    key = (rows, cols)
+    if key not in GOAL_STATES:
+        GOAL_STATES[key] = pack(goal_tiles(rows, cols), cell_bits(rows, cols))
+    return GOAL_STATES[key]
+
+
+class Board:
+    __slots__ = ("rows", "cols", "bits", "mask", "state", "blank")
+
+    def __init__(self, rows, cols, tiles=None):
+        self.rows, self.cols = rows, cols
+        self.bits = cell_bits(rows, cols)
+        self.mask = (1 << self.bits) - 1
+        if tiles is None:
+            tiles = goal_tiles(rows, cols)
+        self.state = pack(tiles, self.bits)
+        self.blank = list(tiles).index(0)
+
+    @classmethod
+    def from_state(cls, rows, cols, state, blank):
+        board = cls.__new__(cls)
+        board.rows, board.cols = rows, cols
+        board.bits = cell_bits(rows, cols)
+        board.mask = (1 << board.bits) - 1
+        board.state = state
+        board.blank = blank
+        return board
+
+    def copy(self):
+        return Board.from_state(self.rows, self.cols, self.state, self.blank)
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def __getitem__(self, index):
+        return (self.state >> (index * self.bits)) & self.mask
+
+    def tiles(self):
+        state, bits, mask = self.state, self.bits, self.mask
+        return [(state >> (index * bits)) & mask for index in range(self.rows * self.cols)]
+
+    def cells(self, start, stop):
+        # Tiles of a run of neighbouring cells; the packed state is shifted once, not per cell
+        bits, mask = self.bits, self.mask
+        run = (self.state >> (start * bits)) & ((1 << ((stop - start) * bits)) - 1)
+        return [(run >> (index * bits)) & mask for index in range(stop - start)]
+
+    def __eq__(self, other):
+        if not isinstance(other, Board):
+            return NotImplemented
+        return self.rows == other.rows and self.cols == other.cols and self.state == other.state
+
+    def __hash__(self):
+        return hash((self.rows, self.cols, self.state))
+
+    def __repr__(self):
+        return f"Board({self.rows}, {self.cols}, {self.tiles()})"
+
+    def is_solved(self):
+        return self.state == goal_state(self.rows, self.cols)
+
+    def target(self, direction):
+        # Index of the tile that would slide into the blank, or -1 if the move is off the board
+        if not can_move(direction, self.blank, self.rows, self.cols):
+            return -1
+        return self.blank + blank_offset(direction, self.cols)
+
+    def move(self, direction):
+        target = self.target(direction)
+        if target < 0:
+            return False
+        # The blank cell holds 0, so one XOR moves the tile there and clears its old cell
+        tile = (self.state >> (target * self.bits)) & self.mask
+        self.state ^= (tile << (target * self.bits)) | (tile << (self.blank * self.bits))
+        self.blank = target
+        return True
+
+    def apply_moves(self, directions):
+        rows, cols, bits, mask = self.rows, self.cols, self.bits, self.mask
+        state, blank = self.state, self.blank
+        row, col = divmod(blank, cols)
+        applied = 0
+        for direction in directions:
+            if direction == "up" and row < rows - 1:
+                target = blank + cols
+                row += 1
+            elif direction == "down" and row > 0:
+                target = blank - cols
+                row -= 1
+            elif direction == "left" and col < cols - 1:
+                target = blank + 1
+                col += 1
+            elif direction == "right" and col > 0:
+                target = blank - 1
+                col -= 1
+            else:
+                continue
+            tile = (state >> (target * bits)) & mask
+            state ^= (tile << (target * bits)) | (tile << (blank * bits))
+            blank = target
+            applied += 1
+        self.state, self.blank = state, blank
+        return applied
@@ -0,0 +1,169 @@
+import os
+import pickle
+import random
+import threading
+from persistence import write_atomic
+from board import goal_tiles
+from solver import Heuristic, is_solvable
+from workers import process_pool, stop_pool
+
+DIFFICULTIES = ("easy", "medium", "hard")
+POOL_SIZE = 20
+# Random walks need far too many steps to scramble boards past this many cells
+WALK_LIMIT = 100
+PARTIAL_FRACTIONS = {"easy": (0.05, 0.4), "medium": (0.4, 0.8)}
+# Tiny boards cannot reach every grade, so after this many tries the closest board is used
+GRADE_ATTEMPTS = 200
+
+
+def random_estimate(rows, cols):
+    # Expected Manhattan distance of a uniformly shuffled board
+    per_tile = (rows * rows - 1) / (3 * rows) + (cols * cols - 1) / (3 * cols)
+    return per_tile * (rows * cols - 1)
+
+
+def grade(tiles, rows, cols):
+    estimate = Heuristic(rows, cols).estimate(tiles)
+    reference = random_estimate(rows, cols)
+    if estimate < 0.4 * reference:
+        return "easy"
+    if estimate < 0.8 * reference:
+        return "medium"
+    return "hard"
+
+
+def random_solvable(rows, cols, rng):
+    tiles = goal_tiles(rows, cols)
+    rng.shuffle(tiles)
+    if not is_solvable(tiles, rows, cols):
+        # Swapping two numbered tiles flips the permutation parity
+        first, second = [index for index, tile in enumerate(tiles) if tile != 0][:2]
+        tiles[first], tiles[second] = tiles[second], tiles[first]
+    return tiles
+
+
+def random_partial(rows, cols, fraction, rng):
+    # Shuffle only a random share of the tiles among their own cells
+    tiles = goal_tiles(rows, cols)
+    cells = rng.sample(range(len(tiles) - 1), max(2, int(fraction * (len(tiles) - 1))))
+    values = [tiles[cell] for cell in cells]
+    rng.shuffle(values)
+    for cell, value in zip(cells, values):
+        tiles[cell] = value
+    if not is_solvable(tiles, rows, cols):
+        tiles[cells[0]], tiles[cells[1]] = tiles[cells[1]], tiles[cells[0]]
+    return tiles
+
+
+def random_walk(rows, cols, length, rng):
+    tiles = goal_tiles(rows, cols)
+    blank = len(tiles) - 1
+    previous = None
+    for _ in range(length):
+        row, col = divmod(blank, cols)
+        options = []
+        if row > 0:
+            options.append(blank - cols)
+        if row < rows - 1:
+            options.append(blank + cols)
+        if col > 0:
+            options.append(blank - 1)
+        if col < cols - 1:
+            options.append(blank + 1)
+        if previous in options and len(options) > 1:
+            options.remove(previous)
+        target = rng.choice(options)
+        tiles[blank], tiles[target] = tiles[target], 0
+        previous, blank = blank, target
+    return tiles
+
+
+def generate_board(rows, cols, difficulty, rng=None):
+    rng = rng or random.Random()
+    size = rows * cols
+    goal = goal_tiles(rows, cols)
+    wanted = DIFFICULTIES.index(difficulty)
+    closest, closest_gap = goal, len(DIFFICULTIES)
+    for _ in range(GRADE_ATTEMPTS):
+        if difficulty == "hard":
+            tiles = random_solvable(rows, cols, rng)
+        elif size > WALK_LIMIT:
+            tiles = random_partial(rows, cols, rng.uniform(*PARTIAL_FRACTIONS[difficulty]), rng)
+        else:
+            longest = size * 2 if difficulty == "easy" else size * max(6, rows + cols)
+            tiles = random_walk(rows, cols, rng.randint(size, longest), rng)
+        if tiles == goal:
+            continue
+        gap = abs(DIFFICULTIES.index(grade(tiles, rows, cols)) - wanted)
+        if gap == 0:
+            return tiles
+        if gap < closest_gap:
+            closest, closest_gap = tiles, gap
+    return closest
+
+
+def generate_boards(rows, cols, difficulty, count):
+    rng = random.Random()
+    return [tuple(generate_board(rows, cols, difficulty, rng)) for _ in range(count)]
+
+
+# Every pool in the process goes through this lock, and each change re-reads the file, so a pool
+# that was created earlier never writes back boards a newer game has already taken
+POOL_LOCK = threading.Lock()
+
+
+class ScramblePool:
+    def __init__(self, pool_file="scrambles.pkl"):
+        self.pool_file = pool_file
+        self.executor = None
+        self.pending = set()
+
+    def load_pool(self):
+        if os.path.exists(self.pool_file):
+            try:
+                with open(self.pool_file, "rb") as f:
+                    return pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                pass
+        return {}
+
+    def save_pool(self, boards):
+        write_atomic(self.pool_file, pickle.dumps(boards))
+
+    def pop(self, rows, cols, difficulty):
+        with POOL_LOCK:
+            boards = self.load_pool()
+            ready = boards.get((rows, cols, difficulty))
+            tiles = ready.pop() if ready else None
+            if tiles is not None:
+                self.save_pool(boards)
+        if tiles is None:
+            return generate_board(rows, cols, difficulty)
+        return list(tiles)
+
+    def refill(self, rows, cols, difficulty):
+        key = (rows, cols, difficulty)
+        with POOL_LOCK:
+            missing = POOL_SIZE - len(self.load_pool().get(key, []))
+            if missing <= 0 or key in self.pending:
+                return
+            self.pending.add(key)
+        if self.executor is None:
+            self.executor = process_pool()
+        future = self.executor.submit(generate_boards, rows, cols, difficulty, missing)
+        future.add_done_callback(lambda done: self.store(key, done))
+
+    def store(self, key, future):
+        with POOL_LOCK:
+            self.pending.discard(key)
+            if future.cancelled() or future.exception() is not None:
+                return
+            boards = self.load_pool()
+            ready = boards.setdefault(key, [])
+            ready.extend(future.result()[:POOL_SIZE - len(ready)])
+            self.save_pool(boards)
+
+    def shutdown(self):
+        if self.executor is not None:
+            stop_pool(self.executor)
+            self.executor = None
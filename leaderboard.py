@@ -0,0 +1,78 @@
+from bisect import bisect_left, insort
+
+
+class SortedIndex:
+    # A sorted list of (value, name) keys. Rank lookups bisect in O(log n); an update moves part of
+    # the list in memory, which is O(n) but cheap next to redrawing the stats window
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def load(self, values):
+        # One sort for the whole table instead of an insertion per name
+        self.entries = {name: (value, name) for name, value in values}
+        self.keys = sorted(self.entries.values())
+
+    def update(self, name, value):
+        # Ties are broken by name so every key is unique and can be found by bisection
+        old = self.entries.get(name)
+        if old is not None:
+            del self.keys[bisect_left(self.keys, old)]
+        key = (value, name)
+        self.entries[name] = key
+        insort(self.keys, key)
+
+    def top(self, count, offset=0):
+        return self.keys[offset:offset + count]
+
+    def rank(self, name):
+        key = self.entries.get(name)
+        if key is None:
+            return None
+        return bisect_left(self.keys, key) + 1
+
+    def percentile(self, name):
+        # Share of ranked players this player is ahead of
+        rank = self.rank(name)
+        if rank is None:
+            return None
+        return 100.0 * (len(self.keys) - rank) / len(self.keys)
+
+
+class Leaderboard:
+    def __init__(self):
+        self.best_time = SortedIndex()
+        self.average_moves = SortedIndex()
+
+    def index(self, order):
+        return self.best_time if order == "best_time" else self.average_moves
+
+    def load(self, players):
+        # players holds (name, games_played, total_moves, best_time) rows
+        self.best_time.load(
+            (name, best_time) for name, _, _, best_time in players if best_time != float('inf')
+        )
+        self.average_moves.load(
+            (name, total_moves / games_played) for name, games_played, total_moves, _ in players if games_played
+        )
+
+    def update(self, name, games_played, total_moves, best_time):
+        if best_time != float('inf'):
+            self.best_time.update(name, best_time)
+        if games_played:
+            self.average_moves.update(name, total_moves / games_played)
+
+    def top(self, order, count, offset=0):
+        return self.index(order).top(count, offset)
+
+    def rank(self, order, name):
+        return self.index(order).rank(name)
+
+    def percentile(self, order, name):
+        return self.index(order).percentile(name)
+
+    def size(self, order):
+        return len(self.index(order))
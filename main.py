@@ -1,6 +1,11 @@
+import multiprocessing
 from menu import MainMenu
+from scene_manager import SceneManager
 
 
 if __name__ == "__main__":
-    menu = MainMenu("config.xml")
-    menu.run()
\ No newline at end of file
+    # Frozen builds start their solver and generator workers by re-running this executable
+    multiprocessing.freeze_support()
+    scene_manager = SceneManager("config.xml")
+    scene_manager.push(MainMenu(scene_manager))
+    scene_manager.run()
\ No newline at end of file
@@ -1,45 +1,23 @@
 import pygame
 import pygame_gui
-import xml.etree.ElementTree as ET
 from puzzle_game import PuzzleGame
 from settings import SettingsMenu, Settings
-from stats import Statistics
+from scene_manager import Scene, SceneManager
 from pygame_gui.elements import UITextEntryLine, UIButton
 
-class MainMenu:
-    def __init__(self, config_filename):
-        self.config = self.load_xml_config(config_filename)
-
-        self.width, self.height = self.config.get("window_width", 800), self.config.get("window_height", 600)
-
-        pygame.init()
-        self.screen = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption("Colorful Puzzle Game")
-
-        self.settings = Settings()  # Создаем экземпляр настроек
-        self.manager = pygame_gui.UIManager((self.width, self.height), 'theme.json')
-        self.stats = Statistics()
-        self.background_image = pygame.image.load("assets/background.jpg").convert()
-        self.background_image = pygame.transform.scale(self.background_image, (self.width, self.height))
+class MainMenu(Scene):
+    def __init__(self, scene_manager):
+        super().__init__(scene_manager)
+        self.settings = Settings(scene_manager.persistence)  # Создаем экземпляр настроек
+        self.stats = scene_manager.stats
+        self.assets = scene_manager.assets
+        self.background_image = self.assets.image("assets/background.jpg", (self.width, self.height))
         self.setup_ui()
 
-        self.running = True
         self.player_name = None
-
-    def load_xml_config(self, filename):
-        try:
-            tree = ET.parse(filename)
-            root = tree.getroot()
-            config = {}
-            for child in root:
-                if child.tag in ["window_width", "window_height", "rows", "cols", "tile_size", "grid_margin", "grid_thickness", "font_size"]:
-                    config[child.tag] = int(child.text)
-                elif child.tag in ["background_color", "tile_color", "text_color"]:
-                    config[child.tag] = tuple(map(int, child.text.split(",")))
-            return config
-        except Exception as e:
-            print(f"Error loading XML configuration from {filename}: {e}")
-            raise
+        self.name_input = None
+        self.settings_menu = None
+        self.stats_window = None
 
     def setup_ui(self):
         self.play_button = pygame_gui.elements.UIButton(
@@ -61,60 +39,49 @@ class MainMenu:
             object_id='#main_menu_button'
         )
 
-    def run(self):
-        clock = pygame.time.Clock()
-        while self.running:
-            time_delta = clock.tick(60) / 1000.0
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                if event.type == pygame.USEREVENT:
-                    if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
-                        if event.ui_element == self.play_button:
-                            self.show_name_input()
-                        elif event.ui_element == self.settings_button:
-                            self.show_settings()
-                        elif event.ui_element == self.stats_button:
-                            self.show_stats()
-                                
-                self.manager.process_events(event)
-            self.manager.update(time_delta)
-            self.screen.blit(self.background_image, (0, 0))
-            self.manager.draw_ui(self.screen)
-            pygame.display.update()
+    def handle_event(self, event):
+        if event.type == pygame.USEREVENT:
+            if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
+                if event.ui_element == self.play_button:
+                    self.show_name_input()
+                elif event.ui_element == self.settings_button:
+                    self.show_settings()
+                elif event.ui_element == self.stats_button:
+                    self.show_stats()
 
+    def draw(self, surface):
+        surface.blit(self.background_image, (0, 0))
+
+    # Sub-screens are built once and kept, so returning to them costs nothing
     def show_name_input(self):
-        self.running = False
-        name_input = NameInputMenu(self)
-        name_input.run()
+        if self.name_input is None:
+            self.name_input = NameInputMenu(self)
+        self.scene_manager.push(self.name_input)
 
     def start_game(self, player_name):
-        game = PuzzleGame("config.xml", player_name)
-        game.run()
+        self.player_name = player_name
+        game = PuzzleGame(self.scene_manager, player_name, self.scene_manager.config.get("race_server"))
+        self.scene_manager.replace(game)
 
     def show_settings(self):
-        self.running = False
-        settings_menu = SettingsMenu(self.width, self.height, self.settings)
-        settings_menu.run()
+        if self.settings_menu is None:
+            self.settings_menu = SettingsMenu(self.scene_manager, self.settings)
+        self.scene_manager.push(self.settings_menu)
 
     def show_stats(self):
         self.stats.load_stats()
-        stats_window = StatsWindow(self)
-        stats_window.run()
+        if self.stats_window is None:
+            self.stats_window = StatsWindow(self)
+        self.scene_manager.push(self.stats_window)
 
-class NameInputMenu:
-    def __init__(self, main_menu):
-        pygame.init()
-        self.width, self.height = main_menu.width, main_menu.height
-        self.screen = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption("Enter Your Name")
+class NameInputMenu(Scene):
+    caption = "Enter Your Name"
 
-        self.manager = pygame_gui.UIManager((self.width, self.height), 'theme.json')
+    def __init__(self, main_menu):
+        super().__init__(main_menu.scene_manager)
         self.main_menu = main_menu
         self.setup_ui()
 
-        self.running = True
-
     def setup_ui(self):
         self.name_input = pygame_gui.elements.UITextEntryLine(
             relative_rect=pygame.Rect((self.width // 2 - 100, self.height // 2 - 50), (200, 50)),
@@ -134,70 +101,120 @@ class NameInputMenu:
             object_id='#main_menu_button'    
         )
 
-    def run(self):
-        clock = pygame.time.Clock()
-        while self.running:
-            time_delta = clock.tick(60) / 1000.0
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.USEREVENT:
-                    if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
-                        if event.ui_element == self.start_button:
-                            self.main_menu.start_game(self.name_input.get_text())
-                        elif event.ui_element == self.back_button:
-                            self.running = False
-                            self.main_menu.running = True
-                self.manager.process_events(event)
-            self.manager.update(time_delta)
-            self.screen.fill((255, 1, 0))
-            self.manager.draw_ui(self.screen)
-            pygame.display.update()
-
-class StatsWindow:
-    def __init__(self, main_menu):
-        pygame.init()
-        self.width, self.height = main_menu.width, main_menu.height
-        self.screen = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption("Statistics")
+    def handle_event(self, event):
+        if event.type == pygame.USEREVENT:
+            if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
+                if event.ui_element == self.start_button:
+                    self.main_menu.start_game(self.name_input.get_text())
+                elif event.ui_element == self.back_button:
+                    self.scene_manager.pop()
+
+    def draw(self, surface):
+        surface.fill((255, 1, 0))
+
+class StatsWindow(Scene):
+    caption = "Statistics"
 
-        self.manager = pygame_gui.UIManager((self.width, self.height), 'theme.json')
+    def __init__(self, main_menu):
+        super().__init__(main_menu.scene_manager)
         self.main_menu = main_menu
+        self.page_size = 10
+        self.page = 0
+        self.order = "best_time"
         self.setup_ui()
 
-        self.running = True
-
     def setup_ui(self):
-        self.stats_label = pygame_gui.elements.UILabel(
-            relative_rect=pygame.Rect((self.width // 2 - 100, self.height // 2 - 50), (200, 50)),
-            text="Statistics Placeholder",
+        self.title_label = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect((self.width // 2 - 250, 20), (500, 40)),
+            text="",
             manager=self.manager
         )
+        self.row_labels = []
+        for i in range(self.page_size):
+            self.row_labels.append(pygame_gui.elements.UILabel(
+                relative_rect=pygame.Rect((self.width // 2 - 250, 70 + i * 34), (500, 30)),
+                text="",
+                manager=self.manager
+            ))
+        self.player_label = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect((self.width // 2 - 250, 70 + self.page_size * 34), (500, 30)),
+            text="",
+            manager=self.manager
+        )
+        self.prev_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect((self.width // 2 - 250, self.height - 130), (160, 50)),
+            text='Prev',
+            manager=self.manager,
+            object_id='#main_menu_button'
+        )
+        self.order_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect((self.width // 2 - 80, self.height - 130), (160, 50)),
+            text='Sort',
+            manager=self.manager,
+            object_id='#main_menu_button'
+        )
+        self.next_button = pygame_gui.elements.UIButton(
+            relative_rect=pygame.Rect((self.width // 2 + 90, self.height - 130), (160, 50)),
+            text='Next',
+            manager=self.manager,
+            object_id='#main_menu_button'
+        )
         self.back_button = pygame_gui.elements.UIButton(
-            relative_rect=pygame.Rect((self.width // 2 - 100, self.height // 2), (200, 50)),
+            relative_rect=pygame.Rect((self.width // 2 - 100, self.height - 70), (200, 50)),
             text='Back',
             manager=self.manager,
             object_id='#main_menu_button'
         )
-
-    def run(self):
-        clock = pygame.time.Clock()
-        while self.running:
-            time_delta = clock.tick(60) / 1000.0
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.USEREVENT:
-                    if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
-                        if event.ui_element == self.back_button:
-                            self.running = False
-                            self.main_menu.running = True
-                self.manager.process_events(event)
-            self.manager.update(time_delta)
-            self.screen.fill((255, 1, 0))
-            self.manager.draw_ui(self.screen)
-            pygame.display.update()
+        self.show_page()
+
+    def show_page(self):
+        leaderboard = self.main_menu.stats.leaderboard
+        total = leaderboard.size(self.order)
+        pages = max(1, (total + self.page_size - 1) // self.page_size)
+        self.page = min(max(self.page, 0), pages - 1)
+
+        title = "Best time" if self.order == "best_time" else "Average moves"
+        self.title_label.set_text(f"{title} - page {self.page + 1}/{pages}")
+        entries = leaderboard.top(self.order, self.page_size, self.page * self.page_size)
+        for i, label in enumerate(self.row_labels):
+            if i < len(entries):
+                value, name = entries[i]
+                value_text = f"{value:.1f} s" if self.order == "best_time" else f"{value:.1f} moves"
+                label.set_text(f"{self.page * self.page_size + i + 1}. {name}  {value_text}")
+            else:
+                label.set_text("")
+
+        player_name = self.main_menu.player_name
+        rank = leaderboard.rank(self.order, player_name) if player_name else None
+        if rank is None:
+            self.player_label.set_text("")
+        else:
+            percentile = leaderboard.percentile(self.order, player_name)
+            self.player_label.set_text(f"{player_name}: rank {rank} of {total}, ahead of {percentile:.0f}%")
+
+    def enter(self):
+        self.show_page()
+
+    def handle_event(self, event):
+        if event.type == pygame.USEREVENT:
+            if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
+                if event.ui_element == self.back_button:
+                    self.scene_manager.pop()
+                elif event.ui_element == self.prev_button:
+                    self.page -= 1
+                    self.show_page()
+                elif event.ui_element == self.next_button:
+                    self.page += 1
+                    self.show_page()
+                elif event.ui_element == self.order_button:
+                    self.order = "average_moves" if self.order == "best_time" else "best_time"
+                    self.page = 0
+                    self.show_page()
+
+    def draw(self, surface):
+        surface.fill((255, 1, 0))
 
 if __name__ == "__main__":
-    menu = MainMenu("config.xml")
-    menu.run()
+    scene_manager = SceneManager("config.xml")
+    scene_manager.push(MainMenu(scene_manager))
+    scene_manager.run()
@@ -0,0 +1,52 @@
+from board import blank_offset
+from solver import inversion_parity
+
+
+class BoardMetrics:
+    # Kept in step with a Board by feeding it every move, so nothing rescans the grid
+    def __init__(self, board, database=None):
+        self.rows, self.cols = board.rows, board.cols
+        tiles = board.tiles()
+        # A pattern database, when one was built for this size, gives a tighter lower bound
+        self.database = database
+        self.pattern_indices = None
+        self.pattern_h = 0
+        if database is not None:
+            self.pattern_indices = database.indices(tiles)
+            self.pattern_h = database.estimate(self.pattern_indices)
+        self.manhattan = 0
+        self.misplaced = 0
+        for index, tile in enumerate(tiles):
+            if tile:
+                self.manhattan += self.tile_distance(tile, index)
+                self.misplaced += index != tile - 1
+        self.parity = inversion_parity([tile for tile in tiles if tile != 0])
+
+    def tile_distance(self, tile, index):
+        row, col = divmod(index, self.cols)
+        goal_row, goal_col = divmod(tile - 1, self.cols)
+        return abs(row - goal_row) + abs(col - goal_col)
+
+    def move(self, board, direction):
+        # Called after board.move(direction): the tile now sits where the blank was
+        source = board.blank
+        target = source - blank_offset(direction, self.cols)
+        tile = board[target]
+        self.manhattan += self.tile_distance(tile, target) - self.tile_distance(tile, source)
+        self.misplaced += (target != tile - 1) - (source != tile - 1)
+        if self.database is not None:
+            group, shift = self.database.shift(tile, source, target, board)
+            old = self.database.lookup(group, self.pattern_indices[group])
+            self.pattern_indices[group] += shift
+            self.pattern_h += self.database.lookup(group, self.pattern_indices[group]) - old
+        if direction in ("up", "down") and self.cols % 2 == 0:
+            # A vertical slide jumps the tile over cols - 1 others in reading order
+            self.parity ^= 1
+
+    @property
+    def distance(self):
+        return max(self.manhattan, self.pattern_h)
+
+    @property
+    def solved(self):
+        return self.misplaced == 0
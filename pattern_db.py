@@ -0,0 +1,122 @@
+import mmap
+import os
+import struct
+
+MAGIC = b"PDB2"
+# magic, rows, cols, number of tile groups; each group follows as its size and its tiles
+HEADER = struct.Struct("<4sBBB")
+DIRECTORY = "pdb"
+# Group sizes used when no explicit partition is given, small enough for the builder to finish in minutes
+DEFAULT_GROUPS = {(3, 3): (4, 4), (4, 4): (5, 5, 5), (5, 5): (4, 4, 4, 4, 4, 4)}
+UNKNOWN = 255
+
+
+def database_path(rows, cols, directory=DIRECTORY):
+    return os.path.join(directory, f"{rows}x{cols}.pdb")
+
+
+def split_groups(rows, cols, sizes):
+    tiles = list(range(1, rows * cols))
+    if sum(sizes) != len(tiles):
+        raise ValueError(f"group sizes {sizes} do not cover the {len(tiles)} tiles of a {rows}x{cols} board")
+    groups = []
+    for size in sizes:
+        groups.append(tuple(tiles[:size]))
+        tiles = tiles[size:]
+    return groups
+
+
+def pattern_weights(size, count):
+    # Place values of the index digits: the first tile has `size` cells to choose from, the next one
+    # fewer, and so on, so a group of `count` tiles needs size!/(size-count)! entries
+    weights = [1] * count
+    for digit in range(count - 2, -1, -1):
+        weights[digit] = weights[digit + 1] * (size - digit - 1)
+    return weights
+
+
+def table_size(size, count):
+    return pattern_weights(size, count)[0] * size if count else 1
+
+
+def pattern_index(positions, size):
+    # Rank of the group's cells as a partial permutation: each digit counts only the cells
+    # that earlier tiles of the group left free
+    index = 0
+    for digit, position in enumerate(positions):
+        index = index * (size - digit) + position - sum(earlier < position for earlier in positions[:digit])
+    return index
+
+
+class PatternDatabase:
+    # Tables stay in the mapped file, so lookups cost one byte read and processes share the pages
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.rows, self.cols, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a current pattern database, rebuild it with pdb_builder.py")
+        size = self.rows * self.cols
+        self.groups = []
+        self.offsets = []
+        # For every tile: its group and its digit in that group's index
+        self.group_of = [-1] * size
+        self.digit_of = [0] * size
+        self.weights = []
+        offset = HEADER.size
+        for group in range(count):
+            length = self.data[offset]
+            tiles = tuple(self.data[offset + 1:offset + 1 + length])
+            offset += 1 + length
+            self.groups.append(tiles)
+            self.weights.append(pattern_weights(size, length))
+            for digit, tile in enumerate(tiles):
+                self.group_of[tile] = group
+                self.digit_of[tile] = digit
+        for tiles in self.groups:
+            self.offsets.append(offset)
+            offset += table_size(size, len(tiles))
+
+    @classmethod
+    def open(cls, rows, cols, directory=DIRECTORY):
+        path = database_path(rows, cols, directory)
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Error loading pattern database {path}: {e}")
+            return None
+
+    def indices(self, tiles):
+        positions = [0] * (self.rows * self.cols)
+        for index, tile in enumerate(tiles):
+            positions[tile] = index
+        return [pattern_index([positions[tile] for tile in group], self.rows * self.cols) for group in self.groups]
+
+    def lookup(self, group, index):
+        return self.data[self.offsets[group] + index]
+
+    def estimate(self, indices):
+        return sum(self.data[offset + index] for offset, index in zip(self.offsets, indices))
+
+    def shift(self, tile, source, target, tiles):
+        # How a group's index changes when `tile` slides from cell `source` to cell `target`.
+        # Tiles of the same group in the cells a vertical slide passes over change rank as well:
+        # an earlier one shifts the moved tile's digit, a later one has its own digit shifted.
+        group = self.group_of[tile]
+        weights = self.weights[group]
+        digit = self.digit_of[tile]
+        change = (target - source) * weights[digit]
+        step = 1 if target > source else -1
+        for cell in range(min(source, target) + 1, max(source, target)):
+            other = tiles[cell]
+            if self.group_of[other] == group:
+                other_digit = self.digit_of[other]
+                change += step * weights[other_digit] if other_digit > digit else -step * weights[digit]
+        return group, change
+
+    def close(self):
+        self.data.close()
+        self.file.close()
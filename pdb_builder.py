@@ -0,0 +1,155 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+from pattern_db import (
+    DEFAULT_GROUPS, DIRECTORY, HEADER, MAGIC, UNKNOWN, PatternDatabase, database_path, pattern_index, pattern_weights,
+    split_groups, table_size,
+)
+from workers import process_pool
+
+# Smaller splits the solver builds by itself the first time a size is played, in seconds rather than minutes
+QUICK_GROUPS = {(4, 4): (4, 4, 4, 3)}
+
+
+def neighbours(rows, cols):
+    cells = []
+    for index in range(rows * cols):
+        row, col = divmod(index, cols)
+        cells.append([
+            cell for cell, valid in (
+                (index - cols, row > 0), (index + cols, row < rows - 1),
+                (index - 1, col > 0), (index + 1, col < cols - 1),
+            ) if valid
+        ])
+    return cells
+
+
+def build_table(rows, cols, tiles):
+    # 0-1 breadth-first search back from the goal over (group placement, blank cell) states.
+    # Only moves of the group's own tiles cost anything, which keeps disjoint groups additive.
+    size = rows * cols
+    count = len(tiles)
+    weights = pattern_weights(size, count)
+    # Each neighbour of a cell comes with the cells a slide between the two passes over
+    adjacent = [
+        [(target, tuple(range(min(blank, target) + 1, max(blank, target)))) for target in cells]
+        for blank, cells in enumerate(neighbours(rows, cols))
+    ]
+    table = bytearray([UNKNOWN]) * table_size(size, count)
+    distance = bytearray([UNKNOWN]) * (len(table) * size)
+
+    start = pattern_index([tile - 1 for tile in tiles], size) * size + size - 1
+    distance[start] = 0
+    queue = deque([start])
+    decoded = None
+    while queue:
+        state = queue.popleft()
+        cost = distance[state]
+        pattern, blank = divmod(state, size)
+        if cost < table[pattern]:
+            table[pattern] = cost
+        if pattern != decoded:
+            # Unrank: each digit picks one of the cells the earlier tiles left free. Free blank moves
+            # are queued first, so the same placement usually comes up several times in a row
+            decoded = pattern
+            occupied = {}
+            free = list(range(size))
+            rest = pattern
+            for digit in range(count):
+                place, rest = divmod(rest, weights[digit])
+                occupied[free.pop(place)] = digit
+        for target, passed in adjacent[blank]:
+            digit = occupied.get(target)
+            if digit is None:
+                following = pattern * size + target
+                if cost < distance[following]:
+                    distance[following] = cost
+                    queue.appendleft(following)
+            else:
+                # Same index change as PatternDatabase.shift, for the tile sliding into the blank
+                change = (blank - target) * weights[digit]
+                step = 1 if blank > target else -1
+                for cell in passed:
+                    other = occupied.get(cell)
+                    if other is not None:
+                        change += step * weights[other] if other > digit else -step * weights[digit]
+                following = (pattern + change) * size + target
+                if cost + 1 < distance[following]:
+                    distance[following] = cost + 1
+                    queue.append(following)
+    return bytes(table)
+
+
+def write_database(path, rows, cols, groups, tables):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, rows, cols, len(groups)))
+        for tiles in groups:
+            f.write(bytes([len(tiles)]) + bytes(tiles))
+        for table in tables:
+            f.write(table)
+    os.replace(temp_path, path)
+
+
+def build_quick_database(rows, cols, directory=DIRECTORY):
+    path = database_path(rows, cols, directory)
+    if (rows, cols) not in QUICK_GROUPS:
+        return False
+    # A file from an older format does not open and is replaced
+    existing = PatternDatabase.open(rows, cols, directory)
+    if existing is not None:
+        existing.close()
+        return False
+    groups = split_groups(rows, cols, QUICK_GROUPS[(rows, cols)])
+    write_database(path, rows, cols, groups, [build_table(rows, cols, tiles) for tiles in groups])
+    return True
+
+
+def parse_groups(text, rows, cols):
+    # Either group sizes ("5-5-5") or explicit tiles ("1,2,5,6/3,4,7,8/...")
+    if "/" in text or "," in text:
+        groups = [tuple(int(tile) for tile in group.split(",")) for group in text.split("/")]
+        tiles = sorted(tile for group in groups for tile in group)
+        if tiles != list(range(1, rows * cols)):
+            raise ValueError(f"groups must use every tile 1..{rows * cols - 1} exactly once")
+        return groups
+    return split_groups(rows, cols, [int(size) for size in text.split("-")])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build additive pattern databases for the hint solver")
+    parser.add_argument("--rows", type=int, default=4)
+    parser.add_argument("--cols", type=int, default=4)
+    parser.add_argument("--groups", help="group sizes such as 6-6-3, or tiles such as 1,2,3/4,5,6/...")
+    parser.add_argument("--directory", default=DIRECTORY)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    if args.groups:
+        groups = parse_groups(args.groups, args.rows, args.cols)
+    elif (args.rows, args.cols) in DEFAULT_GROUPS:
+        groups = split_groups(args.rows, args.cols, DEFAULT_GROUPS[(args.rows, args.cols)])
+    else:
+        parser.error(f"no default groups for {args.rows}x{args.cols}, pass --groups")
+
+    start = time.perf_counter()
+    with process_pool(min(args.workers, len(groups))) as executor:
+        futures = [executor.submit(build_table, args.rows, args.cols, tiles) for tiles in groups]
+        tables = []
+        for tiles, future in zip(groups, futures):
+            tables.append(future.result())
+            print(f"Group {'-'.join(map(str, tiles))}: {len(tables[-1])} entries")
+    path = database_path(args.rows, args.cols, args.directory)
+    write_database(path, args.rows, args.cols, groups, tables)
+    print(f"Wrote {path} in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Changes arriving within this many seconds of each other are written together
+FLUSH_DELAY = 0.5
+# A change whose write keeps failing is retried with the next batches this many times before it is dropped
+WRITE_ATTEMPTS = 5
+
+
+def write_atomic(path, data):
+    # A crash leaves either the old file or the new one, never a truncated file
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class WriteBehind:
+    # Writes are queued by key and done on a background thread. A newer change to a pending key
+    # replaces it, or is merged into it when a merge function is given.
+    def __init__(self, delay=FLUSH_DELAY):
+        self.delay = delay
+        self.pending = OrderedDict()
+        self.writing = False
+        self.flushing = False
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def submit(self, key, writer, value, merge=None):
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("write-behind queue is closed")
+            attempts = 0
+            if merge is not None and key in self.pending:
+                value = merge(self.pending[key][1], value)
+                attempts = self.pending[key][3]
+            self.pending[key] = (writer, value, merge, attempts)
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                # Hold the batch open briefly so bursts of changes collapse into one write
+                deadline = time.monotonic() + self.delay
+                while not self.closed and not self.flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch, self.pending = self.pending, OrderedDict()
+                self.writing = True
+            failed = []
+            for key, (writer, value, merge, attempts) in batch.items():
+                try:
+                    writer(value)
+                except Exception as e:
+                    failed.append((key, writer, value, merge, attempts + 1))
+                    print(f"Error writing {key} (attempt {attempts + 1} of {WRITE_ATTEMPTS}): {e}")
+            with self.condition:
+                for key, writer, value, merge, attempts in failed:
+                    self.retry(key, writer, value, merge, attempts)
+                self.writing = False
+                self.condition.notify_all()
+
+    def retry(self, key, writer, value, merge, attempts):
+        # Called with the condition held. Changes made since the failed batch stay newer than it.
+        if attempts >= WRITE_ATTEMPTS:
+            print(f"Giving up on writing {key}; the change is lost")
+            return
+        if key in self.pending:
+            if merge is None:
+                return
+            value = merge(value, self.pending[key][1])
+        self.pending[key] = (writer, value, merge, attempts)
+        self.pending.move_to_end(key, last=False)
+
+    def flush(self):
+        with self.condition:
+            self.flushing = True
+            self.condition.notify_all()
+            while self.pending or self.writing:
+                self.condition.wait()
+            self.flushing = False
+
+    def close(self):
+        # Everything queued so far is written before the thread exits
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
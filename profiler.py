@@ -0,0 +1,148 @@
+import json
+import time
+from array import array
+
+import pygame
+
+RING_SIZE = 600
+HUD_REFRESH_FRAMES = 15
+HISTOGRAM_BUCKETS = (0.5, 1, 2, 4, 8, 16, 33, 66)
+
+
+def _noop(*args):
+    pass
+
+
+class RingBuffer:
+    def __init__(self, size=RING_SIZE):
+        self.values = array("d", bytes(8 * size))
+        self.size = size
+        self.index = 0
+        self.count = 0
+
+    def add(self, value):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def samples(self):
+        if self.count < self.size:
+            return list(self.values[:self.count])
+        return list(self.values[self.index:]) + list(self.values[:self.index])
+
+    def mean(self):
+        return sum(self.values[:self.count]) / self.count if self.count else 0.0
+
+    def histogram(self):
+        buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        for value in self.values[:self.count]:
+            for i, limit in enumerate(HISTOGRAM_BUCKETS):
+                if value < limit:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+        return buckets
+
+
+class Profiler:
+    # While disabled these hooks are shadowed by a no-op on the instance, so loops pay no branch
+    HOOKS = ("begin_frame", "mark", "end_frame", "draw_hud")
+
+    def __init__(self, enabled=False, dump_file=None):
+        self.dump_file = dump_file
+        self.stages = {}
+        self.frames = RingBuffer()
+        self.frame_start = 0.0
+        self.last = 0.0
+        self.frame_count = 0
+        self.hud_font = None
+        self.hud_surface = None
+        self.enabled = False
+        self.set_enabled(enabled)
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        # Switching on mid-frame must not charge the time since the last sample to this stage
+        self.frame_start = self.last = time.perf_counter()
+        for name in self.HOOKS:
+            if enabled:
+                self.__dict__.pop(name, None)
+            else:
+                setattr(self, name, _noop)
+        self.hud_surface = None
+
+    def toggle(self):
+        self.set_enabled(not self.enabled)
+
+    def process_event(self, event, renderer):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.toggle()
+            renderer.invalidate()
+
+    def begin_frame(self):
+        self.frame_start = self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        ring = self.stages.get(stage)
+        if ring is None:
+            ring = self.stages[stage] = RingBuffer()
+        ring.add((now - self.last) * 1000.0)
+        self.last = now
+
+    def end_frame(self):
+        self.frames.add((time.perf_counter() - self.frame_start) * 1000.0)
+        self.frame_count += 1
+
+    def hud_lines(self):
+        frame_ms = self.frames.mean()
+        lines = [f"FPS {1000.0 / frame_ms:.0f}  frame {frame_ms:.2f} ms" if frame_ms else "FPS -"]
+        for stage, ring in self.stages.items():
+            lines.append(f"{stage} {ring.mean():.2f} ms")
+        return lines
+
+    def draw_hud(self, surface, renderer):
+        # Text is re-rendered only every few frames; in between the cached overlay is blitted
+        if self.hud_surface is None or self.frame_count % HUD_REFRESH_FRAMES == 0:
+            if self.hud_font is None:
+                self.hud_font = pygame.font.Font("assets/fonts/Ubuntu-Regular.ttf", 16)
+            lines = [self.hud_font.render(line, True, (255, 255, 255)) for line in self.hud_lines()]
+            width = max(line.get_width() for line in lines) + 12
+            height = sum(line.get_height() for line in lines) + 8
+            self.hud_surface = pygame.Surface((width, height), pygame.SRCALPHA)
+            self.hud_surface.fill((0, 0, 0, 160))
+            y = 4
+            for line in lines:
+                self.hud_surface.blit(line, (6, y))
+                y += line.get_height()
+        renderer.add(surface.blit(self.hud_surface, (8, 8)))
+
+    def summary(self):
+        stages = {"frame": self.frames}
+        stages.update(self.stages)
+        result = {}
+        for stage, ring in stages.items():
+            samples = sorted(ring.samples())
+            if not samples:
+                continue
+            result[stage] = {
+                "mean": ring.mean(),
+                "p50": samples[len(samples) // 2],
+                "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+                "histogram_ms": dict(zip([f"<{limit}" for limit in HISTOGRAM_BUCKETS] + ["more"], ring.histogram())),
+                "samples": ring.samples(),
+            }
+        return result
+
+    def dump(self):
+        if not self.dump_file or not self.frames.count:
+            return
+        with open(self.dump_file, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+def create_profiler(config):
+    return Profiler(config.get("perf_hud", 0) == 1, config.get("perf_dump"))
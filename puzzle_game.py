@@ -1,13 +1,22 @@
 import pygame
 import pygame_gui
-import random
-import xml.etree.ElementTree as ET
-from stats import Statistics
-
-class PuzzleGame:
-    def __init__(self, config_filename, player_name):
-        self.config = self.load_xml_config(config_filename)
-        self.width, self.height = self.config.get("window_width", 800), self.config.get("window_height", 600)
+from concurrent.futures.process import BrokenProcessPool
+from starfield import StarField
+from solver import MAX_SOLVER_CELLS, SolverWorker
+from board import Board, blank_offset
+from generator import ScramblePool, DIFFICULTIES
+from replay import ReplayRecorder
+from tile_view import TileView
+from metrics import BoardMetrics
+from pattern_db import PatternDatabase
+from scene_manager import Scene, SceneManager, ACTIVE, AMBIENT
+from race_client import RaceSession
+from race_protocol import BOARD, END, RACE, RESULT, STANDINGS, decode_race, decode_result, decode_standings, decode_tiles
+
+class PuzzleGame(Scene):
+    def __init__(self, scene_manager, player_name, race_address=None, pool_file="scrambles.pkl", record=True):
+        super().__init__(scene_manager)
+        self.config = scene_manager.config
         self.rows, self.cols = self.config.get("rows", 4), self.config.get("cols", 4)
         self.tile_size = self.config.get("tile_size", 100)
         self.grid_margin = self.config.get("grid_margin", 5)
@@ -16,142 +25,379 @@ class PuzzleGame:
         self.background_color = self.config.get("background_color", (0, 0, 0))
         self.tile_color = self.config.get("tile_color", (255, 255, 255))
         self.text_color = self.config.get("text_color", (0, 0, 0))
+        self.difficulty = self.config.get("difficulty", "medium")
+        if self.difficulty not in DIFFICULTIES:
+            print(f"Unknown difficulty {self.difficulty!r}, using 'medium'")
+            self.difficulty = "medium"
+        self.gradient_top = (0, 0, 0)
+        self.gradient_bottom = (25, 25, 112)
 
         self.player_name = player_name
+        # Games that are not recorded leave no replay or statistics behind and never top up the pool
+        self.record = record
 
-        pygame.init()
-        self.screen = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption("Colorful Puzzle Game")
+        self.screen = scene_manager.screen
+        self.renderer = scene_manager.renderer
+        self.stats = scene_manager.stats
+        self.assets = scene_manager.assets
 
-        self.manager = pygame_gui.UIManager((self.width, self.height))
-        self.stats = Statistics()
+        # Boards come solvable and graded from a pool that is topped up in the background;
+        # a race server deals its own board, so until then the solved board is shown
+        self.scrambles = ScramblePool(pool_file)
+        if race_address:
+            self.board = Board(self.rows, self.cols)
+        else:
+            self.board = Board(self.rows, self.cols, self.scrambles.pop(self.rows, self.cols, self.difficulty))  # 0 is the empty space
+            if record:
+                self.scrambles.refill(self.rows, self.cols, self.difficulty)
+        self.recorder = ReplayRecorder(self.board, self.player_name)
+        # Pattern databases from pdb_builder.py are mapped read-only, not loaded
+        self.database = PatternDatabase.open(self.rows, self.cols)
+        self.metrics = BoardMetrics(self.board, self.database)
+        self.solved = False
+        self.assisted = False
+        self.distance_label = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect((self.width // 2 - 250, self.height - 40), (500, 30)),
+            text="",
+            manager=self.manager
+        )
+        self.update_readout()
 
-        # Load tile textures or images (example textures)
-        self.tile_images = []
-        for i in range(1, self.rows * self.cols):
-            image = pygame.Surface((self.tile_size, self.tile_size))
-            image.fill((random.randint(50, 200), random.randint(50, 200), random.randint(50, 200)))  # Random color
-            pygame.draw.rect(image, (0, 0, 0), (0, 0, self.tile_size, self.tile_size), 5)  # Border
-            self.tile_images.append(image)
+        # Picture mode slices an image into tiles instead of numbering colored ones
+        self.picture = None
+        if self.config.get("picture"):
+            try:
+                self.picture = self.assets.image(self.config["picture"])
+            except (pygame.error, OSError) as e:
+                print(f"Error loading picture {self.config['picture']}: {e}")
 
-        self.tiles = list(range(1, self.rows * self.cols)) + [0]  # Last tile is the empty space
-        random.shuffle(self.tiles)
-        self.empty_tile = self.tiles.index(0)
+        self.view = self.build_view()
+        self.dragging = False
 
-        self.font = pygame.font.Font("assets/fonts/Ubuntu-Regular.ttf", self.font_size)
-        self.running = True
+        # In a race the server deals the board and keeps score; moves wait until it starts
+        self.race = None
+        self.race_state = None
+        if race_address:
+            self.race = RaceSession(race_address, player_name)
+            self.race_state = "waiting"
+            self.standings_label = pygame_gui.elements.UILabel(
+                relative_rect=pygame.Rect((self.width // 2 - 250, 10), (500, 30)),
+                text="",
+                manager=self.manager
+            )
+            self.distance_label.set_text(f"Waiting for race at {race_address}...")
 
         pygame.mixer.init()
-        self.tile_move_sound = pygame.mixer.Sound('assets/music/Carton_move_2.wav')
+        self.tile_move_sound = self.assets.sound('assets/music/Carton_move_2.wav')
 
-        pygame.mixer.music.load('assets/music/Pixel Dreams.mp3')
-        pygame.mixer.music.set_volume(0.3)
-        pygame.mixer.music.play(-1)
+        # Hints and auto-solve are computed off the render loop by a solver process
+        self.solver = SolverWorker()
+        self.solver_request = None
+        self.solver_board = None
+        self.solver_mode = None
+        self.hint_move = None
+        self.auto_solve_moves = []
+        self.auto_solve_delay = 150
+        self.next_auto_move_time = 0
+
+        # Gradient is rendered once and rebuilt only when its size or colors change
+        self.background_cache = None
+        self.background_cache_key = None
 
         # Background effects: falling stars
-        self.stars = [{'x': random.randint(0, self.width), 'y': random.randint(0, self.height), 'speed': random.uniform(0.5, 2.5)} for _ in range(100)]
+        self.stars = StarField(self.width, self.height, self.config.get("star_count", 100))
 
-    def load_xml_config(self, filename):
-        try:
-            tree = ET.parse(filename)
-            root = tree.getroot()
-            config = {}
-            for child in root:
-                if child.tag in ["window_width", "window_height", "rows", "cols", "tile_size", "grid_margin", "grid_thickness", "font_size"]:
-                    config[child.tag] = int(child.text)
-                elif child.tag in ["background_color", "tile_color", "text_color"]:
-                    config[child.tag] = tuple(map(int, child.text.split(",")))
-            return config
-        except Exception as e:
-            print(f"Error loading XML configuration from {filename}: {e}")
-            raise
+    def build_view(self):
+        # Tiles are drawn from one shared atlas, and only the cells inside the window
+        view = TileView(
+            self.rows, self.cols, self.tile_size, self.grid_margin, self.width, self.height,
+            lambda size: self.assets.font("assets/fonts/Ubuntu-Regular.ttf", size), self.font_size, self.text_color,
+            self.picture,
+        )
+        view.follow(self.board.blank)
+        return view
 
     def draw_tiles(self):
-        total_width = self.cols * (self.tile_size + self.grid_margin) - self.grid_margin
-        total_height = self.rows * (self.tile_size + self.grid_margin) - self.grid_margin
-        start_x = (self.width - total_width) // 2
-        start_y = (self.height - total_height) // 2
-
-        for i in range(self.rows):
-            for j in range(self.cols):
-                tile = self.tiles[i * self.cols + j]
-                if tile != 0:
-                    x = start_x + j * (self.tile_size + self.grid_margin)
-                    y = start_y + i * (self.tile_size + self.grid_margin)
-                    # Example: Draw textured tiles
-                    self.screen.blit(self.tile_images[tile - 1], (x, y))
-                    text = self.font.render(str(tile), True, self.text_color)
-                    text_rect = text.get_rect(center=(x + self.tile_size // 2, y + self.tile_size // 2))
-                    self.screen.blit(text, text_rect)
+        self.view.draw(self.screen, self.board)
+
+    @property
+    def tiles(self):
+        return self.board.tiles()
+
+    @property
+    def empty_tile(self):
+        return self.board.blank
 
     def move_tile(self, direction):
-        row, col = divmod(self.empty_tile, self.cols)
-        if direction == "down" and row > 0:
-            swap_index = self.empty_tile - self.cols
-            self.tile_move_sound.play()
-        elif direction == "up" and row < self.rows - 1:
-            swap_index = self.empty_tile + self.cols
-            self.tile_move_sound.play()
-        elif direction == "right" and col > 0:
-            swap_index = self.empty_tile - 1
-            self.tile_move_sound.play()
-        elif direction == "left" and col < self.cols - 1:
-            swap_index = self.empty_tile + 1
-            self.tile_move_sound.play()
-        else:
+        empty_tile = self.board.blank
+        if self.solved or self.race_state in ("waiting", "over") or not self.board.move(direction):
+            return False
+        if self.race is not None:
+            self.race.send_move(direction)
+        self.metrics.move(self.board, direction)
+        self.recorder.record(direction, pygame.time.get_ticks())
+        self.tile_move_sound.play()
+        self.view.refresh(self.board, empty_tile, self.board.blank)
+        self.renderer.add(self.view.cell_rect(empty_tile))
+        self.renderer.add(self.view.cell_rect(self.board.blank))
+        self.clear_hint()
+        if self.view.follow(self.board.blank):
+            self.renderer.invalidate()
+        self.update_readout()
+        if self.metrics.solved:
+            self.finish_game()
+        return True
+
+    def update_readout(self):
+        self.distance_label.set_text(f"Distance to solved: {self.metrics.distance}   Misplaced tiles: {self.metrics.misplaced}")
+
+    def finish_game(self):
+        self.solved = True
+        self.cancel_auto_solve()
+        self.recorder.finish(pygame.time.get_ticks())
+        if self.record:
+            self.recorder.save()
+        seconds = self.recorder.elapsed_ms / 1000.0
+        if self.race is not None:
+            # The server times the race and records the result
+            self.distance_label.set_text(f"Solved in {self.recorder.move_count} moves - waiting for the official time")
+            return
+        # Boards finished by the auto-solver do not count towards the player's record
+        if self.record and not self.assisted:
+            self.stats.update_player_stats(self.player_name, moves=self.recorder.move_count, time=seconds)
+        self.distance_label.set_text(f"Solved in {self.recorder.move_count} moves, {seconds:.1f} s - press Esc")
+
+    def request_solution(self, mode):
+        if self.solved or self.race is not None:
+            return
+        if self.rows * self.cols > MAX_SOLVER_CELLS:
+            self.distance_label.set_text("Hints and auto-solve are not available on boards this large")
+            return
+        if self.solver_request is not None and not self.solver_request.done():
+            self.solver_mode = mode
+            return
+        self.solver_board = self.board.copy()
+        self.solver_mode = mode
+        self.solver_request = self.solver.submit(self.tiles, self.rows, self.cols)
+
+    def poll_solver(self):
+        if self.solver_request is None or not self.solver_request.done():
+            return
+        request, self.solver_request = self.solver_request, None
+        try:
+            moves = request.result()
+        except BrokenProcessPool:
+            # The solver process died; the next request starts a fresh one
+            self.solver.reset()
+            self.distance_label.set_text("The solver stopped unexpectedly - try again")
+            return
+        if self.solver_board != self.board:
+            # The board moved on while the solver was running
+            return
+        if moves is None:
+            self.distance_label.set_text("No solution found for the current board")
+        elif moves and self.solver_mode == "hint":
+            self.hint_move = moves[0]
+            self.renderer.add(self.hint_rect())
+        elif moves and self.solver_mode == "auto":
+            self.auto_solve_moves = moves
+            self.assisted = True
+            self.next_auto_move_time = pygame.time.get_ticks()
+
+    def step_auto_solve(self):
+        if self.auto_solve_moves and pygame.time.get_ticks() >= self.next_auto_move_time:
+            self.move_tile(self.auto_solve_moves.pop(0))
+            self.next_auto_move_time = pygame.time.get_ticks() + self.auto_solve_delay
+
+    def cancel_auto_solve(self):
+        self.auto_solve_moves = []
+
+    def hint_rect(self):
+        index = self.empty_tile + blank_offset(self.hint_move, self.cols)
+        return self.view.cell_rect(index)
+
+    def clear_hint(self):
+        if self.hint_move is not None:
+            self.renderer.add(self.hint_rect())
+            self.hint_move = None
+
+    def draw_hint(self):
+        if self.hint_move is not None:
+            pygame.draw.rect(self.screen, (255, 215, 0), self.hint_rect(), 4)
+
+    def poll_race(self):
+        if self.race is None:
             return
-        self.tiles[self.empty_tile], self.tiles[swap_index] = self.tiles[swap_index], self.tiles[self.empty_tile]
-        self.empty_tile = swap_index
+        for kind, body in self.race.poll():
+            if kind == RACE:
+                self.start_race(*decode_race(body))
+            elif kind == BOARD:
+                self.reset_board(self.rows, self.cols, decode_tiles(body))
+                self.restart_recording()
+            elif kind == STANDINGS:
+                self.show_standings(*decode_standings(body))
+            elif kind == RESULT:
+                finish_ms, moves = decode_result(body)
+                self.distance_label.set_text(f"Finished in {moves} moves, {finish_ms / 1000.0:.2f} s - press Esc")
+            elif kind == END and self.race_state != "over":
+                if self.race_state == "waiting":
+                    self.distance_label.set_text("No race could be joined - press Esc")
+                elif not self.solved:
+                    self.distance_label.set_text("Race over - press Esc")
+                self.race_state = "over"
+
+    def start_race(self, race_id, rows, cols, tiles):
+        self.reset_board(rows, cols, tiles)
+        self.restart_recording()
+        self.race_state = "racing"
+        self.standings_label.set_text(f"Race {race_id} - go!")
+
+    def restart_recording(self):
+        # A replay has to start from a board that really was on screen, so the server's board starts a new one
+        self.recorder = ReplayRecorder(self.board, self.player_name)
+        self.recorder.start(pygame.time.get_ticks())
+
+    def reset_board(self, rows, cols, tiles):
+        # Used for the race board and whenever the server says this copy has drifted
+        resized = (rows, cols) != (self.rows, self.cols)
+        self.rows, self.cols = rows, cols
+        self.board = Board(rows, cols, tiles)
+        if resized:
+            if self.database is not None:
+                self.database.close()
+            self.database = PatternDatabase.open(rows, cols)
+            self.view = self.build_view()
+        else:
+            self.view.refresh(self.board, *range(len(self.board)))
+            self.view.follow(self.board.blank)
+        self.metrics = BoardMetrics(self.board, self.database)
+        self.renderer.invalidate()
+        self.update_readout()
+
+    def show_standings(self, rank, total, distance, leaders):
+        text = f"Place {rank} of {total}"
+        if leaders:
+            name, leader_distance, moves, finish_ms = leaders[0]
+            if finish_ms:
+                text += f" - {name} won in {finish_ms / 1000.0:.2f} s"
+            else:
+                text += f" - leader {name}, {leader_distance} to go"
+        self.standings_label.set_text(text)
+
+    def update_stars(self, time_delta):
+        self.stars.update(time_delta)
 
-    def update_stars(self):
-        for star in self.stars:
-            star['y'] += star['speed']
-            if star['y'] > self.height:
-                star['x'] = random.randint(0, self.width)
-                star['y'] = 0
+    def star_rects(self):
+        return self.stars.rects()
 
     def draw_stars(self):
-        for star in self.stars:
-            pygame.draw.circle(self.screen, (255, 255, 255), (int(star['x']), int(star['y'])), 2)
+        self.stars.draw(self.screen)
 
-    def draw_gradient_background(self):
-        color_top = (0, 0, 0)
-        color_bottom = (25, 25, 112)
+    def build_gradient_background(self):
+        # Render a 1-pixel wide strip and stretch it across the window
+        strip = pygame.Surface((1, self.height))
         for y in range(self.height):
             color = (
-                int(color_top[0] + (color_bottom[0] - color_top[0]) * y / self.height),
-                int(color_top[1] + (color_bottom[1] - color_top[1]) * y / self.height),
-                int(color_top[2] + (color_bottom[2] - color_top[2]) * y / self.height),
+                int(self.gradient_top[0] + (self.gradient_bottom[0] - self.gradient_top[0]) * y / self.height),
+                int(self.gradient_top[1] + (self.gradient_bottom[1] - self.gradient_top[1]) * y / self.height),
+                int(self.gradient_top[2] + (self.gradient_bottom[2] - self.gradient_top[2]) * y / self.height),
             )
-            pygame.draw.line(self.screen, color, (0, y), (self.width, y))
-
-    def run(self):
-        frame_idx = 0
-        clock = pygame.time.Clock()
-        while self.running:
-            time_delta = clock.tick(60) / 1000.0
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_UP:
-                        self.move_tile("up")
-                    elif event.key == pygame.K_DOWN:
-                        self.move_tile("down")
-                    elif event.key == pygame.K_LEFT:
-                        self.move_tile("left")
-                    elif event.key == pygame.K_RIGHT:
-                        self.move_tile("right")
-
-            self.update_stars()
-            self.draw_gradient_background()
-            self.draw_stars()
-            self.draw_tiles()
-            pygame.display.update()
+            strip.set_at((0, y), color)
+        return pygame.transform.scale(strip, (self.width, self.height)).convert()
+
+    def draw_gradient_background(self):
+        key = (self.width, self.height, self.gradient_top, self.gradient_bottom)
+        if self.background_cache is None or self.background_cache_key != key:
+            self.background_cache = self.build_gradient_background()
+            self.background_cache_key = key
+        self.screen.blit(self.background_cache, (0, 0))
+
+    def enter(self):
+        if self.recorder.start_time is None:
+            self.recorder.start(pygame.time.get_ticks())
+        if self.race is None and self.rows * self.cols <= MAX_SOLVER_CELLS:
+            self.solver.prepare(self.rows, self.cols)
+        if not pygame.mixer.music.get_busy():
+            pygame.mixer.music.load(self.assets.music('assets/music/Pixel Dreams.mp3'), 'mp3')
+            pygame.mixer.music.set_volume(0.3)
+            pygame.mixer.music.play(-1)
+
+    def handle_event(self, event):
+        if event.type == pygame.KEYDOWN:
+            if event.key in (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT):
+                self.cancel_auto_solve()
+            if event.key == pygame.K_UP:
+                self.move_tile("up")
+            elif event.key == pygame.K_DOWN:
+                self.move_tile("down")
+            elif event.key == pygame.K_LEFT:
+                self.move_tile("left")
+            elif event.key == pygame.K_RIGHT:
+                self.move_tile("right")
+            elif event.key == pygame.K_h:
+                self.request_solution("hint")
+            elif event.key == pygame.K_a:
+                self.request_solution("auto")
+            elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                self.zoom(self.view.zoom_in())
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.zoom(self.view.zoom_out())
+            elif event.key == pygame.K_ESCAPE:
+                self.scene_manager.pop()
+        elif event.type == pygame.MOUSEWHEEL:
+            if event.y > 0:
+                self.zoom(self.view.zoom_in(pygame.mouse.get_pos()))
+            elif event.y < 0:
+                self.zoom(self.view.zoom_out(pygame.mouse.get_pos()))
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button in (1, 2, 3):
+            self.dragging = True
+        elif event.type == pygame.MOUSEBUTTONUP and event.button in (1, 2, 3):
+            self.dragging = False
+        elif event.type == pygame.MOUSEMOTION and self.dragging:
+            if self.view.pan(-event.rel[0], -event.rel[1]):
+                self.renderer.invalidate()
+
+    def zoom(self, changed):
+        if changed:
+            self.renderer.invalidate()
+
+    def update(self, time_delta):
+        self.poll_solver()
+        self.poll_race()
+        self.step_auto_solve()
+
+        if self.renderer.enabled:
+            self.renderer.add_many(self.star_rects())
+        self.update_stars(time_delta)
+        if self.renderer.enabled:
+            self.renderer.add_many(self.star_rects())
+
+    def draw(self, surface):
+        self.draw_gradient_background()
+        self.draw_stars()
+        self.draw_tiles()
+        self.draw_hint()
+
+    def activity(self):
+        if self.auto_solve_moves:
+            return ACTIVE
+        if self.solver_request is not None or self.race_state in ("waiting", "racing") or self.stars.count:
+            return AMBIENT
+        return super().activity()
 
+    def exit(self):
+        self.solver.shutdown()
+        self.scrambles.shutdown()
+        if self.race is not None:
+            self.race.close()
         pygame.mixer.music.stop()
-        self.stats.update_player_stats(self.player_name, moves=100, time=60.5)
+        if self.database is not None:
+            self.database.close()
+        if self.record and not self.solved and self.recorder.move_count:
+            self.recorder.finish(pygame.time.get_ticks())
+            self.recorder.save()
 
 if __name__ == "__main__":
-    game = PuzzleGame("config.xml", "Player1")
-    game.run()
+    scene_manager = SceneManager("config.xml")
+    scene_manager.push(PuzzleGame(scene_manager, "Player1"))
+    scene_manager.run()
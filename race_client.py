@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import queue
+import random
+import sys
+import threading
+import time
+
+from board import DIRECTIONS, OPPOSITE, Board
+from race_protocol import END, RACE, RESULT, MessageReader, decode_race, decode_result, encode_hello, encode_move
+from race_server import HOST, PORT
+from solver import solve_bounded
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    if not host:
+        return address, PORT
+    return host, int(port)
+
+
+class RaceClientProtocol(asyncio.Protocol):
+    def __init__(self, player_name, receive):
+        self.player_name = player_name
+        self.receive = receive
+        self.reader = MessageReader()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(encode_hello(self.player_name))
+
+    def data_received(self, data):
+        for kind, body in self.reader.feed(data):
+            self.receive(kind, body)
+
+    def connection_lost(self, exc):
+        # Always report the end, even if the server went away without saying so
+        self.receive(END, b"")
+
+    def send_move(self, direction):
+        if not self.transport.is_closing():
+            self.transport.write(encode_move(direction))
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class RaceSession:
+    # The connection lives on its own thread and event loop; the game loop only polls a queue
+    def __init__(self, address, player_name):
+        self.address = address
+        self.player_name = player_name
+        self.messages = queue.SimpleQueue()
+        self.loop = asyncio.new_event_loop()
+        self.protocol = None
+        self.thread = threading.Thread(target=self.run, name="race-client", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        host, port = parse_address(self.address)
+        try:
+            _, self.protocol = self.loop.run_until_complete(self.loop.create_connection(
+                lambda: RaceClientProtocol(self.player_name, self.receive), host, port
+            ))
+        except (OSError, ValueError) as e:
+            print(f"Error connecting to race server {self.address}: {e}")
+            self.receive(END, b"")
+        else:
+            self.loop.run_forever()
+        self.loop.close()
+
+    def receive(self, kind, body):
+        self.messages.put((kind, body))
+
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def send_move(self, direction):
+        if self.protocol is not None:
+            self.call(self.protocol.send_move, direction)
+
+    def call(self, callback, *args):
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop has already shut down
+            pass
+
+    def stop(self):
+        if self.protocol is not None:
+            self.protocol.close()
+        self.loop.stop()
+
+    def close(self):
+        self.call(self.stop)
+        self.thread.join(timeout=1.0)
+
+
+async def run_bot(name, host, port, delay, detours, ramp, solutions, rng):
+    # Scripted player: solves the race board once per race (shared by every bot in it) and plays it back
+    await asyncio.sleep(rng.uniform(0, ramp))
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue()
+    try:
+        _, protocol = await loop.create_connection(
+            lambda: RaceClientProtocol(name, lambda kind, body: messages.put_nowait((kind, body))), host, port
+        )
+    except OSError as e:
+        print(f"{name}: {e}")
+        return None
+
+    kind, body = await messages.get()
+    if kind != RACE:
+        protocol.close()
+        return None
+    race_id, rows, cols, tiles = decode_race(body)
+    key = (race_id, tuple(tiles))
+    if key not in solutions:
+        solutions[key] = loop.run_in_executor(None, solve_bounded, tiles, rows, cols)
+    solution = await solutions[key]
+    if not solution:
+        protocol.close()
+        return None
+
+    board = Board(rows, cols, tiles)
+    for direction in solution:
+        if rng.random() < detours:
+            # Wander off and come straight back, as a person fumbling a move would
+            detour = rng.choice([move for move in DIRECTIONS if board.target(move) >= 0])
+            protocol.send_move(detour)
+            protocol.send_move(OPPOSITE[detour])
+        board.move(direction)
+        protocol.send_move(direction)
+        await asyncio.sleep(delay * rng.uniform(0.5, 1.5))
+
+    result = None
+    while True:
+        kind, body = await messages.get()
+        if kind == RESULT:
+            result = decode_result(body)
+        elif kind == END:
+            return result
+
+
+async def run_bots(args):
+    rng = random.Random(args.seed)
+    solutions = {}
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_bot(f"Bot {index + 1}", args.host, args.port, args.delay, args.detours, args.ramp, solutions, rng)
+        for index in range(args.bots)
+    ))
+    finished = [result for result in results if result is not None]
+    print(f"{len(finished)}/{args.bots} bots finished {len(solutions)} races in {time.perf_counter() - start:.1f} s")
+    if finished:
+        times = sorted(finish_ms for finish_ms, _ in finished)
+        print(f"Finish times: best {times[0] / 1000:.2f} s, median {times[len(times) // 2] / 1000:.2f} s, "
+              f"worst {times[-1] / 1000:.2f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Race scripted bots against a race server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--bots", type=int, default=8)
+    parser.add_argument("--delay", type=float, default=0.2, help="average seconds between moves")
+    parser.add_argument("--detours", type=float, default=0.1, help="chance of a wasted move pair before each move")
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which the bots connect")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    asyncio.run(run_bots(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
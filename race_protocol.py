@@ -0,0 +1,106 @@
+import struct
+from board import DIRECTIONS
+
+# A move is a single byte holding its direction index. Every other message is a type byte
+# (never below len(DIRECTIONS)) followed by a 16-bit body length and the body.
+HELLO = ord("H")
+RACE = ord("R")
+BOARD = ord("B")
+STANDINGS = ord("S")
+RESULT = ord("F")
+END = ord("E")
+MOVE = -1
+
+FRAME = struct.Struct("<BH")
+RACE_HEADER = struct.Struct("<HBB")
+STANDINGS_HEADER = struct.Struct("<HHHB")
+STANDING = struct.Struct("<HHIB")
+RESULT_BODY = struct.Struct("<IH")
+
+
+def encode(kind, body=b""):
+    return FRAME.pack(kind, len(body)) + body
+
+
+def encode_move(direction):
+    return bytes((DIRECTIONS.index(direction),))
+
+
+def encode_hello(name):
+    return encode(HELLO, name.encode("utf-8")[:255])
+
+
+def encode_tiles(tiles):
+    return struct.pack(f"<{len(tiles)}H", *tiles)
+
+
+def decode_tiles(body):
+    return list(struct.unpack(f"<{len(body) // 2}H", body))
+
+
+def encode_race(race_id, rows, cols, tiles):
+    return encode(RACE, RACE_HEADER.pack(race_id, rows, cols) + encode_tiles(tiles))
+
+
+def decode_race(body):
+    race_id, rows, cols = RACE_HEADER.unpack_from(body)
+    return race_id, rows, cols, decode_tiles(body[RACE_HEADER.size:])
+
+
+def encode_standing(name, distance, moves, finish_ms):
+    name = name.encode("utf-8")[:255]
+    return STANDING.pack(min(distance, 0xFFFF), min(moves, 0xFFFF), finish_ms, len(name)) + name
+
+
+def encode_standings(rank, total, distance, leaders):
+    # `leaders` is the already encoded top of the table, shared by every recipient
+    return encode(STANDINGS, STANDINGS_HEADER.pack(rank, total, min(distance, 0xFFFF), leaders[0]) + leaders[1])
+
+
+def decode_standings(body):
+    rank, total, distance, count = STANDINGS_HEADER.unpack_from(body)
+    offset = STANDINGS_HEADER.size
+    leaders = []
+    for _ in range(count):
+        leader_distance, moves, finish_ms, length = STANDING.unpack_from(body, offset)
+        offset += STANDING.size
+        name = body[offset:offset + length].decode("utf-8", "replace")
+        offset += length
+        leaders.append((name, leader_distance, moves, finish_ms))
+    return rank, total, distance, leaders
+
+
+def encode_result(finish_ms, moves):
+    return encode(RESULT, RESULT_BODY.pack(finish_ms, min(moves, 0xFFFF)))
+
+
+def decode_result(body):
+    return RESULT_BODY.unpack(body)
+
+
+class MessageReader:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        # Returns every complete message received so far; partial frames wait for more data
+        self.buffer += data
+        messages = []
+        offset = 0
+        buffer = self.buffer
+        while offset < len(buffer):
+            kind = buffer[offset]
+            if kind < len(DIRECTIONS):
+                messages.append((MOVE, DIRECTIONS[kind]))
+                offset += 1
+                continue
+            if len(buffer) - offset < FRAME.size:
+                break
+            _, length = FRAME.unpack_from(buffer, offset)
+            end = offset + FRAME.size + length
+            if end > len(buffer):
+                break
+            messages.append((kind, bytes(buffer[offset + FRAME.size:end])))
+            offset = end
+        del buffer[:offset]
+        return messages
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import signal
+import sys
+
+from board import Board
+from generator import DIFFICULTIES, generate_board
+from metrics import BoardMetrics
+from race_protocol import (
+    BOARD, END, HELLO, MOVE, MessageReader, encode, encode_race, encode_result, encode_standing,
+    encode_standings, encode_tiles,
+)
+from stats import Statistics
+
+HOST = "127.0.0.1"
+PORT = 8765
+RACE_SIZE = 8
+LOBBY_SECONDS = 5.0
+TIME_LIMIT = 300.0
+# Standings go out at most this often, and only when something changed
+STANDINGS_INTERVAL = 0.25
+LEADERS = 5
+
+
+class RacePlayer(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.reader = MessageReader()
+        self.name = None
+        self.race = None
+        self.board = None
+        self.metrics = None
+        self.moves = 0
+        self.finish_ms = 0
+        self.connected = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connected = True
+
+    def data_received(self, data):
+        for kind, body in self.reader.feed(data):
+            if kind == MOVE:
+                if self.race is not None:
+                    self.race.move(self, body)
+            elif kind == HELLO and self.name is None:
+                self.name = body.decode("utf-8", "replace") or "Player"
+                self.server.join(self)
+            else:
+                self.transport.close()
+                return
+
+    def connection_lost(self, exc):
+        self.connected = False
+        if self.race is not None:
+            self.race.leave(self)
+
+    def send(self, data):
+        if self.connected:
+            self.transport.write(data)
+
+
+class Race:
+    def __init__(self, server, race_id):
+        self.server = server
+        self.loop = server.loop
+        self.race_id = race_id
+        self.players = []
+        self.tiles = None
+        self.started = 0.0
+        self.finished = False
+        self.changed = False
+        self.limit_timer = None
+        self.standings_timer = None
+        self.lobby_timer = self.loop.call_later(server.lobby_seconds, self.start)
+
+    def add(self, player):
+        player.race = self
+        self.players.append(player)
+        if len(self.players) >= self.server.race_size:
+            self.start()
+
+    def start(self):
+        if self.tiles is not None:
+            return
+        self.lobby_timer.cancel()
+        self.server.close_lobby(self)
+        if not self.players:
+            self.server.races.discard(self)
+            return
+        server = self.server
+        self.tiles = generate_board(server.rows, server.cols, server.difficulty)
+        message = encode_race(self.race_id, server.rows, server.cols, self.tiles)
+        for player in self.players:
+            player.board = Board(server.rows, server.cols, self.tiles)
+            player.metrics = BoardMetrics(player.board)
+            player.send(message)
+        self.started = self.loop.time()
+        self.changed = True
+        self.limit_timer = self.loop.call_later(server.time_limit, self.end)
+        self.standings_timer = self.loop.call_later(STANDINGS_INTERVAL, self.tick)
+
+    def move(self, player, direction):
+        if player.board is None or player.finish_ms or self.finished:
+            return
+        if not player.board.move(direction):
+            # The client is out of step; send the authoritative board so it can resync
+            player.send(encode(BOARD, encode_tiles(player.board.tiles())))
+            return
+        player.metrics.move(player.board, direction)
+        player.moves += 1
+        self.changed = True
+        if player.metrics.solved:
+            player.finish_ms = max(1, int((self.loop.time() - self.started) * 1000))
+            player.send(encode_result(player.finish_ms, player.moves))
+            self.end_if_done()
+
+    def leave(self, player):
+        if self.tiles is None:
+            self.players.remove(player)
+        else:
+            self.end_if_done()
+
+    def cancel(self):
+        # A race that never left the lobby just sends its players away
+        self.lobby_timer.cancel()
+        self.server.close_lobby(self)
+        for player in self.players:
+            player.send(encode(END))
+            player.transport.close()
+        self.server.races.discard(self)
+
+    def end_if_done(self):
+        if all(player.finish_ms or not player.connected for player in self.players):
+            self.end()
+
+    def tick(self):
+        if self.finished:
+            return
+        if self.changed:
+            self.broadcast_standings()
+        self.standings_timer = self.loop.call_later(STANDINGS_INTERVAL, self.tick)
+
+    def broadcast_standings(self):
+        self.changed = False
+        # Finishers first by time, then everyone else by distance left and moves made
+        order = sorted(
+            self.players,
+            key=lambda player: (player.finish_ms == 0, player.finish_ms or player.metrics.distance, player.moves),
+        )
+        leaders = order[:LEADERS]
+        shared = (len(leaders), b"".join(
+            encode_standing(player.name, player.metrics.distance, player.moves, player.finish_ms) for player in leaders
+        ))
+        for rank, player in enumerate(order, start=1):
+            player.send(encode_standings(rank, len(order), player.metrics.distance, shared))
+
+    def end(self):
+        if self.finished or self.tiles is None:
+            return
+        self.finished = True
+        self.limit_timer.cancel()
+        self.standings_timer.cancel()
+        self.broadcast_standings()
+        for player in self.players:
+            if player.finish_ms:
+                self.server.stats.update_player_stats(player.name, moves=player.moves, time=player.finish_ms / 1000.0)
+            player.send(encode(END))
+            player.transport.close()
+        self.server.races.discard(self)
+
+
+class RaceServer:
+    def __init__(self, stats, rows=4, cols=4, difficulty="medium", race_size=RACE_SIZE,
+                 lobby_seconds=LOBBY_SECONDS, time_limit=TIME_LIMIT):
+        self.stats = stats
+        self.rows, self.cols = rows, cols
+        self.difficulty = difficulty
+        self.race_size = race_size
+        self.lobby_seconds = lobby_seconds
+        self.time_limit = time_limit
+        self.loop = None
+        self.server = None
+        self.lobby = None
+        self.races = set()
+        self.next_race_id = 1
+
+    async def start(self, host=HOST, port=PORT):
+        self.loop = asyncio.get_running_loop()
+        self.server = await self.loop.create_server(lambda: RacePlayer(self), host, port)
+        return self.server
+
+    def join(self, player):
+        # Players wait in the open race until it fills up or its lobby time runs out
+        if self.lobby is None:
+            self.lobby = Race(self, self.next_race_id)
+            self.next_race_id = self.next_race_id % 0xFFFF + 1
+            self.races.add(self.lobby)
+        self.lobby.add(player)
+
+    def close_lobby(self, race):
+        if self.lobby is race:
+            self.lobby = None
+
+    async def close(self):
+        for race in list(self.races):
+            if race.tiles is None:
+                race.cancel()
+            else:
+                race.end()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def serve(args, stats):
+    server = RaceServer(stats, args.rows, args.cols, args.difficulty, args.race_size, args.lobby, args.time_limit)
+    await server.start(args.host, args.port)
+    print(f"Race server listening on {args.host}:{args.port}")
+    stopped = asyncio.Event()
+    try:
+        # A plain kill should still end the races and write their results
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except (NotImplementedError, AttributeError):
+        pass
+    try:
+        await stopped.wait()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host head-to-head races on a shared scramble")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--rows", type=int, default=4)
+    parser.add_argument("--cols", type=int, default=4)
+    parser.add_argument("--difficulty", choices=DIFFICULTIES, default="medium")
+    parser.add_argument("--race-size", type=int, default=RACE_SIZE, help="players per race")
+    parser.add_argument("--lobby", type=float, default=LOBBY_SECONDS, help="seconds a race waits for players")
+    parser.add_argument("--time-limit", type=float, default=TIME_LIMIT)
+    args = parser.parse_args(argv)
+
+    stats = Statistics()
+    try:
+        asyncio.run(serve(args, stats))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stats.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
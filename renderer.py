@@ -0,0 +1,57 @@
+import pygame
+
+
+class DirtyRectRenderer:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.dirty_rects = []
+        self.full_redraw = True
+        self.ui_snapshot = {}
+
+    def add(self, rect):
+        if self.enabled:
+            self.dirty_rects.append(pygame.Rect(rect))
+
+    def add_many(self, rects):
+        if self.enabled:
+            self.dirty_rects.extend(rects)
+
+    def invalidate(self):
+        self.full_redraw = True
+
+    def process_event(self, event):
+        # The window contents are lost on expose/resize, so push the whole frame once
+        if event.type in (pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+            self.invalidate()
+
+    def track_ui(self, manager):
+        if not self.enabled:
+            return
+        # pygame_gui does not report what it redrew, so diff the visible blit data
+        snapshot = {}
+        for blit_data in manager.ui_group.visible:
+            image, rect = blit_data[0], blit_data[1]
+            snapshot[id(blit_data)] = (image, pygame.Rect(rect))
+            previous = self.ui_snapshot.get(id(blit_data))
+            if previous is None:
+                self.dirty_rects.append(pygame.Rect(rect))
+            elif previous[0] is not image or previous[1] != rect:
+                self.dirty_rects.append(previous[1])
+                self.dirty_rects.append(pygame.Rect(rect))
+        for key, previous in self.ui_snapshot.items():
+            if key not in snapshot:
+                self.dirty_rects.append(previous[1])
+        self.ui_snapshot = snapshot
+
+        # Hover and focus animations redraw element images in place
+        for element in manager.ui_group.sprites():
+            if getattr(element, "hovered", False) or getattr(element, "is_focused", False):
+                self.dirty_rects.append(pygame.Rect(element.rect))
+
+    def update(self):
+        if not self.enabled or self.full_redraw:
+            pygame.display.update()
+            self.full_redraw = False
+        elif self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
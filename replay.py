@@ -0,0 +1,153 @@
+import itertools
+import mmap
+import os
+import struct
+import time
+from board import Board, DIRECTIONS
+
+MAGIC = b"RPL1"
+# magic, rows, cols, keyframe interval, move count, keyframe count, elapsed ms, player name length
+HEADER = struct.Struct("<4sHHIIIQH")
+# Each move is one word: 2 bits of direction and 30 bits of milliseconds since the previous move
+MOVE = struct.Struct("<I")
+DELTA_LIMIT = (1 << 30) - 1
+# Keyframes store the packed board followed by its blank index and the elapsed ms at that move
+KEYFRAME_TAIL = struct.Struct("<IQ")
+KEYFRAME_INTERVAL = 64
+
+
+def reserve_path(directory, stem):
+    # Creating the file with O_EXCL claims the name, so saves that share a stem never overwrite each other
+    for counter in itertools.count():
+        path = os.path.join(directory, f"{stem}.rpl" if counter == 0 else f"{stem}-{counter}.rpl")
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return path
+
+
+def state_size(board):
+    return (board.rows * board.cols * board.bits + 7) // 8
+
+
+class ReplayRecorder:
+    def __init__(self, board, player_name, keyframe_interval=KEYFRAME_INTERVAL):
+        self.board = board.copy()
+        self.player_name = player_name
+        self.keyframe_interval = keyframe_interval
+        self.moves = []
+        self.keyframes = [(self.board.state, self.board.blank, 0)]
+        self.start_time = None
+        self.last_time = None
+        self.end_time = None
+
+    def start(self, ticks):
+        self.start_time = self.last_time = ticks
+
+    def record(self, direction, ticks):
+        if self.start_time is None:
+            self.start(ticks)
+        delta = min(ticks - self.last_time, DELTA_LIMIT)
+        self.last_time = ticks
+        self.moves.append((DIRECTIONS.index(direction) << 30) | delta)
+        self.board.move(direction)
+        if len(self.moves) % self.keyframe_interval == 0:
+            self.keyframes.append((self.board.state, self.board.blank, ticks - self.start_time))
+
+    def finish(self, ticks):
+        self.end_time = ticks
+
+    @property
+    def move_count(self):
+        return len(self.moves)
+
+    @property
+    def elapsed_ms(self):
+        if self.start_time is None:
+            return 0
+        end_time = self.end_time if self.end_time is not None else self.last_time
+        return end_time - self.start_time
+
+    def save(self, directory="replays"):
+        os.makedirs(directory, exist_ok=True)
+        now = time.time()
+        stem = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}-{os.getpid()}"
+        path = reserve_path(directory, stem)
+        name = self.player_name.encode("utf-8")[:0xFFFF]
+        size = state_size(self.board)
+
+        data = bytearray(HEADER.pack(
+            MAGIC, self.board.rows, self.board.cols, self.keyframe_interval,
+            len(self.moves), len(self.keyframes), self.elapsed_ms, len(name),
+        ))
+        data += name
+        data += struct.pack(f"<{len(self.moves)}I", *self.moves)
+        for state, blank, elapsed in self.keyframes:
+            data += state.to_bytes(size, "little")
+            data += KEYFRAME_TAIL.pack(blank, elapsed)
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return path
+
+
+class Replay:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.rows, self.cols, self.keyframe_interval, self.move_count,
+         self.keyframe_count, self.elapsed_ms, name_length) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a replay file")
+        self.player_name = bytes(self.data[HEADER.size:HEADER.size + name_length]).decode("utf-8")
+        self.moves_offset = HEADER.size + name_length
+        self.keyframes_offset = self.moves_offset + self.move_count * MOVE.size
+        self.state_size = state_size(Board(self.rows, self.cols))
+
+    def __len__(self):
+        return self.move_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def move(self, index):
+        word = MOVE.unpack_from(self.data, self.moves_offset + index * MOVE.size)[0]
+        return DIRECTIONS[word >> 30], word & DELTA_LIMIT
+
+    def moves(self, start=0, stop=None):
+        stop = self.move_count if stop is None else stop
+        return [self.move(index)[0] for index in range(start, stop)]
+
+    def keyframe(self, number):
+        offset = self.keyframes_offset + number * (self.state_size + KEYFRAME_TAIL.size)
+        state = int.from_bytes(self.data[offset:offset + self.state_size], "little")
+        blank, elapsed = KEYFRAME_TAIL.unpack_from(self.data, offset + self.state_size)
+        return Board.from_state(self.rows, self.cols, state, blank), elapsed
+
+    def nearest_keyframe(self, index):
+        return min(index // self.keyframe_interval, self.keyframe_count - 1)
+
+    def board_at(self, index):
+        # Board after the first `index` moves: nearest earlier keyframe plus the moves since
+        index = max(0, min(index, self.move_count))
+        number = self.nearest_keyframe(index)
+        board, _ = self.keyframe(number)
+        board.apply_moves(self.moves(number * self.keyframe_interval, index))
+        return board
+
+    def time_at(self, index):
+        index = max(0, min(index, self.move_count))
+        number = self.nearest_keyframe(index)
+        _, elapsed = self.keyframe(number)
+        return elapsed + sum(self.move(i)[1] for i in range(number * self.keyframe_interval, index))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
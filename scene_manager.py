@@ -0,0 +1,220 @@
+import xml.etree.ElementTree as ET
+
+import pygame
+import pygame_gui
+from pygame_gui.elements import UITextEntryLine
+from assets import AssetManager
+from profiler import create_profiler
+from renderer import DirtyRectRenderer
+from stats import Statistics
+from persistence import WriteBehind
+
+FRAME_RATE = 60
+# How much each frame has to do: animating at full rate, ambient effects only, or nothing until input
+ACTIVE, AMBIENT, IDLE = "active", "ambient", "idle"
+# Keep running at full rate briefly after input so pygame_gui hover/press transitions can finish
+INPUT_LINGER_MS = 300
+
+
+def load_xml_config(filename):
+    try:
+        tree = ET.parse(filename)
+        root = tree.getroot()
+        config = {}
+        for child in root:
+            if child.tag in ["window_width", "window_height", "rows", "cols", "tile_size", "grid_margin", "grid_thickness", "font_size", "dirty_rects", "star_count", "perf_hud", "ambient_fps", "idle_timeout"]:
+                config[child.tag] = int(child.text)
+            elif child.tag in ["background_color", "tile_color", "text_color"]:
+                config[child.tag] = tuple(map(int, child.text.split(",")))
+            elif child.tag in ["difficulty", "perf_dump", "loop_policy", "picture", "race_server"]:
+                config[child.tag] = (child.text or "").strip()
+        return config
+    except Exception as e:
+        print(f"Error loading XML configuration from {filename}: {e}")
+        raise
+
+
+class Scene:
+    caption = "Colorful Puzzle Game"
+
+    def __init__(self, scene_manager):
+        self.scene_manager = scene_manager
+        self.width, self.height = scene_manager.width, scene_manager.height
+        self.manager = scene_manager.ui_manager(type(self).__name__)
+
+    def enter(self):
+        pass
+
+    def exit(self):
+        pass
+
+    def handle_event(self, event):
+        pass
+
+    def update(self, time_delta):
+        pass
+
+    def draw(self, surface):
+        pass
+
+    def activity(self):
+        # A focused text entry blinks its cursor; the rest of the UI only changes on input
+        for element in self.manager.get_focus_set() or ():
+            if isinstance(element, UITextEntryLine):
+                return AMBIENT
+        return IDLE
+
+
+class SceneManager:
+    def __init__(self, config_filename, stats_file="statistics.db"):
+        self.config_filename = config_filename
+        self.config = load_xml_config(config_filename)
+        self.width, self.height = self.config.get("window_width", 800), self.config.get("window_height", 600)
+
+        pygame.init()
+        self.screen = pygame.display.set_mode((self.width, self.height))
+        pygame.display.set_caption(Scene.caption)
+
+        self.assets = AssetManager()
+        self.preload_assets()
+        self.show_loading_screen()
+
+        self.renderer = DirtyRectRenderer(self.config.get("dirty_rects", 0) == 1)
+        self.profiler = create_profiler(self.config)
+        # Settings and statistics are saved by one background writer, drained on shutdown
+        self.persistence = WriteBehind()
+        self.stats = Statistics(stats_file, persistence=self.persistence)
+        self.ui_managers = {}
+        self.stack = []
+        self.transitions = []
+        self.running = True
+
+        # "fixed" redraws at the full frame rate; "adaptive" slows down or sleeps when little changes
+        self.loop_policy = self.config.get("loop_policy", "adaptive")
+        self.ambient_fps = self.config.get("ambient_fps", 20)
+        self.idle_timeout = self.config.get("idle_timeout", 500)
+        self.wake_until = 0
+
+    def preload_assets(self):
+        self.assets.preload("image", "assets/background.jpg")
+        self.assets.preload("json", "theme.json")
+        self.assets.preload("bytes", "assets/fonts/Ubuntu-Regular.ttf")
+        self.assets.preload("bytes", "assets/music/Pixel Dreams.mp3")
+        if self.config.get("picture"):
+            self.assets.preload("image", self.config["picture"])
+        if pygame.mixer.get_init():
+            self.assets.preload("sound", "assets/music/Carton_move_2.wav")
+
+    def show_loading_screen(self):
+        font = pygame.font.Font(None, 36)
+        clock = pygame.time.Clock()
+        while not self.assets.done():
+            pygame.event.pump()
+            self.screen.fill((0, 0, 0))
+            text = font.render("Loading...", True, (255, 255, 255))
+            self.screen.blit(text, text.get_rect(center=(self.width // 2, self.height // 2 - 30)))
+            bar = pygame.Rect(self.width // 2 - 150, self.height // 2, 300, 20)
+            pygame.draw.rect(self.screen, (255, 255, 255), bar, 2)
+            pygame.draw.rect(self.screen, (52, 224, 189), (bar.x, bar.y, int(bar.width * self.assets.progress()), bar.height))
+            pygame.display.update()
+            clock.tick(60)
+
+    def ui_manager(self, key):
+        # One UIManager per scene type for the whole session; a fresh scene reuses it after a reset
+        manager = self.ui_managers.get(key)
+        if manager is None:
+            manager = pygame_gui.UIManager((self.width, self.height), self.assets.theme('theme.json'))
+            self.ui_managers[key] = manager
+        else:
+            manager.clear_and_reset()
+        return manager
+
+    @property
+    def current(self):
+        return self.stack[-1] if self.stack else None
+
+    # Transitions requested while handling a frame are applied once the frame is done
+    def push(self, scene):
+        self.transitions.append(("push", scene))
+
+    def pop(self):
+        self.transitions.append(("pop", None))
+
+    def replace(self, scene):
+        self.transitions.append(("replace", scene))
+
+    def apply_transitions(self):
+        while self.transitions:
+            action, scene = self.transitions.pop(0)
+            if action in ("pop", "replace") and self.stack:
+                self.stack.pop().exit()
+            if action in ("push", "replace"):
+                self.stack.append(scene)
+            if self.current is not None:
+                pygame.display.set_caption(self.current.caption)
+                self.current.enter()
+            self.renderer.invalidate()
+            self.wake()
+
+    def wake(self):
+        self.wake_until = pygame.time.get_ticks() + INPUT_LINGER_MS
+
+    def activity(self, scene):
+        if self.loop_policy != "adaptive" or pygame.time.get_ticks() < self.wake_until:
+            return ACTIVE
+        return scene.activity()
+
+    def next_events(self, scene, clock):
+        mode = self.activity(scene)
+        if mode == IDLE:
+            # Sleep in the event queue instead of spinning; the timeout keeps slow UI timers alive
+            event = pygame.event.wait(self.idle_timeout)
+            time_delta = clock.tick() / 1000.0
+            events = [] if event.type == pygame.NOEVENT else [event]
+            events.extend(pygame.event.get())
+        else:
+            time_delta = clock.tick(FRAME_RATE if mode == ACTIVE else self.ambient_fps) / 1000.0
+            events = pygame.event.get()
+        if events:
+            self.wake()
+        return time_delta, events
+
+    def run(self):
+        clock = pygame.time.Clock()
+        self.apply_transitions()
+        while self.running and self.stack:
+            scene = self.current
+            self.profiler.begin_frame()
+            time_delta, events = self.next_events(scene, clock)
+            self.profiler.mark("tick")
+            for event in events:
+                self.renderer.process_event(event)
+                self.profiler.process_event(event, self.renderer)
+                if event.type == pygame.QUIT:
+                    self.running = False
+                scene.handle_event(event)
+                scene.manager.process_events(event)
+            self.profiler.mark("events")
+            scene.manager.update(time_delta)
+            self.profiler.mark("manager.update")
+            scene.update(time_delta)
+            self.renderer.track_ui(scene.manager)
+            self.profiler.mark("update")
+            scene.draw(self.screen)
+            scene.manager.draw_ui(self.screen)
+            self.profiler.mark("draw")
+            self.profiler.draw_hud(self.screen, self.renderer)
+            self.profiler.mark("hud")
+            self.renderer.update()
+            self.profiler.mark("flip")
+            self.profiler.end_frame()
+            self.apply_transitions()
+        self.shutdown()
+
+    def shutdown(self):
+        while self.stack:
+            self.stack.pop().exit()
+        self.profiler.dump()
+        self.assets.shutdown()
+        self.stats.close()
+        self.persistence.close()
@@ -2,11 +2,16 @@ import os
 import pickle
 import pygame
 import pygame_gui
+from scene_manager import Scene
+from persistence import WriteBehind, write_atomic
 
 class Settings:
-    def __init__(self):
+    def __init__(self, persistence=None):
         self.settings_file = "settings.dat"
         self.music_enabled = True
+        # Saving only queues the new values; a background thread writes the file
+        self.owns_persistence = persistence is None
+        self.persistence = persistence if persistence is not None else WriteBehind()
         self.load_settings()
 
     def load_settings(self):
@@ -21,11 +26,17 @@ class Settings:
             self.save_settings()
 
     def save_settings(self):
-        with open(self.settings_file, "wb") as f:
-            settings = {
-                "music_enabled": self.music_enabled,
-            }
-            pickle.dump(settings, f)
+        settings = {
+            "music_enabled": self.music_enabled,
+        }
+        self.persistence.submit(self.settings_file, self.write_settings, settings)
+
+    def write_settings(self, settings):
+        write_atomic(self.settings_file, pickle.dumps(settings))
+
+    def close(self):
+        if self.owns_persistence:
+            self.persistence.close()
 
     def toggle_music(self):
         self.music_enabled = not self.music_enabled
@@ -34,19 +45,13 @@ class Settings:
     def get_music_enabled(self):
         return self.music_enabled
 
-class SettingsMenu:
-    def __init__(self, width, height, settings, main_menu):
-        pygame.init()
-        self.width, self.height = width, height
-        self.screen = pygame.display.set_mode((self.width, self.height))
-        pygame.display.set_caption("Settings")
+class SettingsMenu(Scene):
+    caption = "Settings"
 
-        self.manager = pygame_gui.UIManager((self.width, self.height), 'theme.json')
+    def __init__(self, scene_manager, settings):
+        super().__init__(scene_manager)
         self.settings = settings
-        self.main_menu = main_menu
-
         self.setup_ui()
-        self.running = True
 
     def setup_ui(self):
         self.back_button = pygame_gui.elements.UIButton(
@@ -69,10 +74,9 @@ class SettingsMenu:
         )
 
     def show_main_menu(self):
-        self.running = False
-        self.main_menu.run()
+        self.scene_manager.pop()
 
-    def handle_events(self, event):
+    def handle_event(self, event):
         if event.type == pygame.USEREVENT:
             if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
                 if event.ui_element == self.back_button:
@@ -83,17 +87,6 @@ class SettingsMenu:
                 elif event.ui_element == self.background_button:
                     # Implement logic to change background
                     pass
-        self.manager.process_events(event)
 
-    def run(self):
-        clock = pygame.time.Clock()
-        while self.running:
-            time_delta = clock.tick(60) / 1000.0
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                self.handle_events(event)
-            self.manager.update(time_delta)
-            self.screen.fill((0, 0, 0))
-            self.manager.draw_ui(self.screen)
-            pygame.display.update()
+    def draw(self, surface):
+        surface.fill((0, 0, 0))
@@ -2,7 +2,7 @@ import sys
 from cx_Freeze import setup, Executable
 
 build_exe_options = {
-    "packages": ["pygame", "pygame_gui"],
+    "packages": ["pygame", "pygame_gui", "numpy"],
     "include_files": ["config.xml", "assets/background.jpg"],   # Include config.xml in the build
 }
 
@@ -0,0 +1,283 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+from board import DIRECTIONS, OPPOSITE, blank_offset, can_move
+from pattern_db import DIRECTORY, PatternDatabase, database_path
+from pdb_builder import QUICK_GROUPS, build_quick_database
+from workers import process_pool, stop_pool
+
+FOUND = -1
+TABLE_LIMIT = 2000000
+# (weight, node budget) attempts, from optimal towards greedier but faster searches. Optimal random 4x4
+# boards are out of reach in this budget, so the exact attempt is kept short and the weights climb gently
+SEARCH_SCHEDULE = ((1.0, 3000), (1.3, 6000), (1.6, 10000), (2.0, 20000), (3.0, 50000), (5.0, 100000))
+# Beyond this many cells even the greediest attempt rarely finishes within its budget
+MAX_SOLVER_CELLS = 25
+
+
+def inversion_parity(values):
+    # Parity of the inversion count from the cycle decomposition, linear instead of quadratic
+    seen = [False] * len(values)
+    cycles = 0
+    for start in range(len(values)):
+        if not seen[start]:
+            cycles += 1
+            index = start
+            while not seen[index]:
+                seen[index] = True
+                index = values[index] - 1
+    return (len(values) - cycles) % 2
+
+
+def is_solvable(tiles, rows, cols):
+    inversions = inversion_parity([tile for tile in tiles if tile != 0])
+    if cols % 2 == 1:
+        return inversions % 2 == 0
+    blank_row_from_bottom = rows - tiles.index(0) // cols
+    return (inversions + blank_row_from_bottom) % 2 == 1
+
+
+def line_conflicts(goals):
+    # Tiles in their goal line that must leave it: length minus the longest increasing run
+    if len(goals) < 2:
+        return 0
+    tails = []
+    for goal in goals:
+        low, high = 0, len(tails)
+        while low < high:
+            mid = (low + high) // 2
+            if tails[mid] < goal:
+                low = mid + 1
+            else:
+                high = mid
+        if low == len(tails):
+            tails.append(goal)
+        else:
+            tails[low] = goal
+    return 2 * (len(goals) - len(tails))
+
+
+class Heuristic:
+    def __init__(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        size = rows * cols
+        self.goal_row = [0] * size
+        self.goal_col = [0] * size
+        for tile in range(1, size):
+            self.goal_row[tile], self.goal_col[tile] = divmod(tile - 1, cols)
+
+    def manhattan(self, tiles):
+        total = 0
+        for index, tile in enumerate(tiles):
+            if tile:
+                row, col = divmod(index, self.cols)
+                total += abs(row - self.goal_row[tile]) + abs(col - self.goal_col[tile])
+        return total
+
+    def row_conflicts(self, tiles, row):
+        start = row * self.cols
+        return line_conflicts([
+            self.goal_col[tile] for tile in tiles[start:start + self.cols]
+            if tile and self.goal_row[tile] == row
+        ])
+
+    def col_conflicts(self, tiles, col):
+        return line_conflicts([
+            self.goal_row[tile] for tile in tiles[col::self.cols]
+            if tile and self.goal_col[tile] == col
+        ])
+
+    def row_table(self, tiles):
+        return [self.row_conflicts(tiles, row) for row in range(self.rows)]
+
+    def col_table(self, tiles):
+        return [self.col_conflicts(tiles, col) for col in range(self.cols)]
+
+    def estimate(self, tiles):
+        return self.manhattan(tiles) + sum(self.row_table(tiles)) + sum(self.col_table(tiles))
+
+
+class Solver:
+    def __init__(self, tiles, rows, cols, weight=1.0, max_nodes=None, database=None):
+        self.tiles = list(tiles)
+        self.rows, self.cols = rows, cols
+        self.weight = weight
+        self.max_nodes = max_nodes
+        self.heuristic = Heuristic(rows, cols)
+        self.database = database
+        self.pattern_indices = None
+        self.pattern_h = 0
+        self.nodes = 0
+        self.path = []
+        self.table = {}
+
+    def solve(self):
+        if not is_solvable(self.tiles, self.rows, self.cols):
+            return None
+        tiles = self.tiles
+        blank = tiles.index(0)
+        self.row_lc = self.heuristic.row_table(tiles)
+        self.col_lc = self.heuristic.col_table(tiles)
+        manhattan = self.heuristic.manhattan(tiles)
+        h = manhattan + sum(self.row_lc) + sum(self.col_lc)
+        if self.database is not None:
+            self.pattern_indices = self.database.indices(tiles)
+            self.pattern_h = self.database.estimate(self.pattern_indices)
+        bound = self.weight * max(h, self.pattern_h)
+        while True:
+            self.table.clear()
+            result = self.search(blank, 0, manhattan, h, bound, None)
+            if result == FOUND:
+                return list(self.path)
+            if result is None or result == float("inf"):
+                return None
+            bound = result
+
+    def search(self, blank, g, manhattan, h, bound, previous):
+        # h is Manhattan plus linear conflicts; a pattern database, when loaded, can only raise it
+        f = g + self.weight * max(h, self.pattern_h)
+        if f > bound:
+            return f
+        if h == 0:
+            return FOUND
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            return None
+
+        tiles = self.tiles
+        key = tuple(tiles)
+        seen = self.table.get(key)
+        if seen is not None and seen <= g:
+            return float("inf")
+        if seen is not None or len(self.table) < TABLE_LIMIT:
+            self.table[key] = g
+
+        heuristic = self.heuristic
+        database = self.database
+        cols = self.cols
+        minimum = float("inf")
+        for direction in DIRECTIONS:
+            if direction == previous or not can_move(direction, blank, self.rows, cols):
+                continue
+            target = blank + blank_offset(direction, cols)
+            tile = tiles[target]
+
+            # Only the moved tile's distance and the two lines it crosses change
+            if direction in ("up", "down"):
+                old_row, new_row = target // cols, blank // cols
+                distance = abs(new_row - heuristic.goal_row[tile]) - abs(old_row - heuristic.goal_row[tile])
+                table, lines = self.row_lc, (old_row, new_row)
+                recount = heuristic.row_conflicts
+            else:
+                old_col, new_col = target % cols, blank % cols
+                distance = abs(new_col - heuristic.goal_col[tile]) - abs(old_col - heuristic.goal_col[tile])
+                table, lines = self.col_lc, (old_col, new_col)
+                recount = heuristic.col_conflicts
+
+            tiles[blank], tiles[target] = tile, 0
+            saved = (table[lines[0]], table[lines[1]])
+            table[lines[0]] = recount(tiles, lines[0])
+            table[lines[1]] = recount(tiles, lines[1])
+            child_manhattan = manhattan + distance
+            child_h = child_manhattan + (h - manhattan) - saved[0] - saved[1] + table[lines[0]] + table[lines[1]]
+            if database is not None:
+                # Only the moved tile's group changes its table entry
+                group, shift = database.shift(tile, target, blank, tiles)
+                saved_pattern = (self.pattern_indices[group], self.pattern_h)
+                self.pattern_indices[group] += shift
+                self.pattern_h += database.lookup(group, self.pattern_indices[group]) - database.lookup(group, saved_pattern[0])
+
+            self.path.append(direction)
+            result = self.search(target, g + 1, child_manhattan, child_h, bound, OPPOSITE[direction])
+            if database is not None:
+                self.pattern_indices[group], self.pattern_h = saved_pattern
+            if result == FOUND:
+                tiles[blank], tiles[target] = 0, tile
+                table[lines[0]], table[lines[1]] = saved
+                return FOUND
+            self.path.pop()
+            tiles[blank], tiles[target] = 0, tile
+            table[lines[0]], table[lines[1]] = saved
+            if result is None:
+                return None
+            if result < minimum:
+                minimum = result
+        return minimum
+
+
+def solve(tiles, rows, cols, weight=1.0, max_nodes=None, database=None):
+    return Solver(tiles, rows, cols, weight, max_nodes, database).solve()
+
+
+def solve_bounded(tiles, rows, cols, database=None):
+    if not is_solvable(tiles, rows, cols):
+        return None
+    for weight, max_nodes in SEARCH_SCHEDULE:
+        moves = solve(tiles, rows, cols, weight, max_nodes, database)
+        if moves is not None:
+            return moves
+    return None
+
+
+# Databases opened by this (worker) process; the mapped pages are shared with every other process
+DATABASES = {}
+
+
+def solve_with_database(tiles, rows, cols, directory):
+    # Opened again only when the file changes, so a table built after the worker started is picked up
+    # and an outdated one is reported once rather than on every request
+    key = (rows, cols, directory)
+    path = database_path(rows, cols, directory)
+    stamp = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    if key not in DATABASES or DATABASES[key][0] != stamp:
+        if key in DATABASES and DATABASES[key][1] is not None:
+            DATABASES[key][1].close()
+        DATABASES[key] = (stamp, PatternDatabase.open(rows, cols, directory))
+    return solve_bounded(tiles, rows, cols, DATABASES[key][1])
+
+
+class SolverWorker:
+    def __init__(self, database_directory=DIRECTORY):
+        self.executor = None
+        self.builder = None
+        self.database_directory = database_directory
+        self.prepared = set()
+
+    def start(self):
+        # A separate process keeps the search from competing with the render loop for the GIL
+        if self.executor is None:
+            self.executor = process_pool()
+        return self.executor
+
+    def prepare(self, rows, cols):
+        # On first run the quick pattern database is built in a process of its own, so hints are not
+        # queued behind it; until the file appears they are searched without it
+        if (rows, cols) in self.prepared or (rows, cols) not in QUICK_GROUPS:
+            return
+        self.prepared.add((rows, cols))
+        existing = PatternDatabase.open(rows, cols, self.database_directory)
+        if existing is not None:
+            existing.close()
+            return
+        if self.builder is None:
+            self.builder = process_pool()
+        self.builder.submit(build_quick_database, rows, cols, self.database_directory)
+
+    def submit(self, tiles, rows, cols):
+        try:
+            return self.start().submit(solve_with_database, list(tiles), rows, cols, self.database_directory)
+        except BrokenProcessPool:
+            # The worker died while idle; replace it
+            self.reset()
+            return self.start().submit(solve_with_database, list(tiles), rows, cols, self.database_directory)
+
+    def reset(self):
+        # Drops the search process; the next request starts a new one and a database build carries on
+        if self.executor is not None:
+            stop_pool(self.executor)
+            self.executor = None
+
+    def shutdown(self):
+        self.reset()
+        if self.builder is not None:
+            stop_pool(self.builder)
+            self.builder = None
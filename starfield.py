@@ -0,0 +1,86 @@
+import numpy as np
+import pygame
+
+STAR_RADIUS = 2
+# Past this many stars a single full-window rect is cheaper than per-star dirty rects
+MAX_DIRTY_STARS = 256
+# Past this many stars each one is a plus of five pixels instead of a 13-pixel disc. Stamping 100k
+# discs took about 20 ms a frame; plus shapes take about 7 ms, and a field that dense looks the same
+DENSE_STARS = 10000
+
+
+class StarField:
+    def __init__(self, width, height, count, color=(255, 255, 255)):
+        self.width, self.height = width, height
+        self.count = count
+        self.color = color
+        self.rng = np.random.default_rng()
+
+        self.x = self.rng.integers(0, width + 1, count).astype(np.int32)
+        self.y = self.rng.uniform(0, height, count).astype(np.float32)
+        # Pixels per second, so the fall looks the same at any frame rate
+        self.speed = self.rng.uniform(30.0, 150.0, count).astype(np.float32)
+
+        # Pixel offsets of a filled circle, stamped once per offset for all stars at once
+        radius = 1 if count > DENSE_STARS else STAR_RADIUS
+        self.offsets = [
+            (dx, dy)
+            for dx in range(-radius, radius + 1)
+            for dy in range(-radius, radius + 1)
+            if dx * dx + dy * dy <= radius * radius
+        ]
+        self.sprite = pygame.Surface((STAR_RADIUS * 2 + 1, STAR_RADIUS * 2 + 1))
+        self.sprite.set_colorkey((0, 0, 0))
+        for dx, dy in self.offsets:
+            self.sprite.set_at((dx + STAR_RADIUS, dy + STAR_RADIUS), color)
+
+    def update(self, time_delta):
+        self.y += self.speed * np.float32(time_delta)
+        fallen = self.y > self.height
+        respawned = int(np.count_nonzero(fallen))
+        if respawned:
+            self.x[fallen] = self.rng.integers(0, self.width + 1, respawned)
+            self.y[fallen] = 0
+
+    def draw(self, surface):
+        if surface.get_bytesize() not in (2, 4):
+            self.draw_sprites(surface)
+            return
+        pixels = pygame.surfarray.pixels2d(surface)
+        self.stamp(pixels, surface.map_rgb(self.color))
+        del pixels
+
+    def stamp(self, pixels, mapped):
+        width, height = pixels.shape
+        xs = self.x
+        ys = self.y.astype(np.int32)
+        # Stars clear of the edges are written through flat indices into the pixel buffer
+        rows = pixels.T
+        if rows.flags.c_contiguous:
+            inner = (xs >= STAR_RADIUS) & (xs < width - STAR_RADIUS) & (ys >= STAR_RADIUS) & (ys < height - STAR_RADIUS)
+            flat = rows.reshape(-1)
+            base = ys[inner] * width + xs[inner]
+            for dx, dy in self.offsets:
+                flat[base + (dy * width + dx)] = mapped
+            xs, ys = xs[~inner], ys[~inner]
+        for dx, dy in self.offsets:
+            px = xs + dx
+            py = ys + dy
+            visible = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            pixels[px[visible], py[visible]] = mapped
+
+    def draw_sprites(self, surface):
+        sprite = self.sprite
+        surface.blits(
+            [(sprite, (x - STAR_RADIUS, y - STAR_RADIUS)) for x, y in zip(self.x.tolist(), self.y.astype(np.int32).tolist())],
+            doreturn=False,
+        )
+
+    def rects(self):
+        if self.count > MAX_DIRTY_STARS:
+            return [pygame.Rect(0, 0, self.width, self.height)]
+        size = STAR_RADIUS * 2 + 1
+        return [
+            pygame.Rect(x - STAR_RADIUS, y - STAR_RADIUS, size, size)
+            for x, y in zip(self.x.tolist(), self.y.astype(np.int32).tolist())
+        ]
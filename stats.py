@@ -1,46 +1,165 @@
+import os
 import pickle
+import sqlite3
+from leaderboard import Leaderboard
+from persistence import WriteBehind
+
+
+def merge_deltas(pending, new):
+    # Per-player changes queued between flushes: games and moves add up, the best time is the smallest
+    merged = dict(pending)
+    for name, (games_played, total_moves, best_time) in new.items():
+        if name in merged:
+            old_games, old_moves, old_time = merged[name]
+            merged[name] = (old_games + games_played, old_moves + total_moves, min(old_time, best_time))
+        else:
+            merged[name] = (games_played, total_moves, best_time)
+    return merged
+
 
 class Statistics:
-    def __init__(self):
-        self.stats_file = "statistics.pkl"
+    def __init__(self, stats_file="statistics.db", legacy_file="statistics.pkl", persistence=None):
+        self.stats_file = stats_file
+        self.legacy_file = legacy_file
         self.games_played = 0
         self.total_moves = 0
         self.best_time = float('inf')
-        self.player_stats = {}
+
+        self.connection = sqlite3.connect(self.stats_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+        self.migrate_legacy_stats()
         self.load_stats()
+        # Reads are served from memory: the rows loaded at startup plus this process's own games.
+        # The games themselves reach the database as deltas through a write-behind queue.
+        self.players = {}
+        self.leaderboard = Leaderboard()
+        self.load_leaderboard()
+        self.owns_persistence = persistence is None
+        self.persistence = persistence if persistence is not None else WriteBehind()
+        self.writer_connection = None
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS summary ("
+                "id INTEGER PRIMARY KEY CHECK (id = 1), "
+                "games_played INTEGER NOT NULL, total_moves INTEGER NOT NULL, best_time REAL, "
+                "migrated INTEGER NOT NULL DEFAULT 0)"
+            )
+            self.connection.execute(
+                "INSERT OR IGNORE INTO summary (id, games_played, total_moves, best_time) VALUES (1, 0, 0, NULL)"
+            )
+            # best_time is NULL until the player finishes a game
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS players ("
+                "name TEXT PRIMARY KEY, games_played INTEGER NOT NULL, "
+                "total_moves INTEGER NOT NULL, best_time REAL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS players_best_time ON players (best_time)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS players_games_played ON players (games_played)")
+
+    def migrate_legacy_stats(self):
+        migrated = self.connection.execute("SELECT migrated FROM summary WHERE id = 1").fetchone()[0]
+        if migrated:
+            return
+        stats = None
+        if os.path.exists(self.legacy_file):
+            try:
+                with open(self.legacy_file, "rb") as f:
+                    stats = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                stats = None
+
+        with self.connection:
+            if stats:
+                self.connection.execute(
+                    "UPDATE summary SET games_played = ?, total_moves = ?, best_time = ? WHERE id = 1",
+                    (stats["games_played"], stats["total_moves"], self.to_db_time(stats["best_time"])),
+                )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO players (name, games_played, total_moves, best_time) VALUES (?, ?, ?, ?)",
+                    [
+                        (name, player["games_played"], player["total_moves"], self.to_db_time(player["best_time"]))
+                        for name, player in stats["player_stats"].items()
+                    ],
+                )
+            self.connection.execute("UPDATE summary SET migrated = 1 WHERE id = 1")
+
+    def to_db_time(self, time):
+        return None if time == float('inf') else time
+
+    def from_db_time(self, time):
+        return float('inf') if time is None else time
 
     def load_stats(self):
-        try:
-            with open(self.stats_file, "rb") as f:
-                stats = pickle.load(f)
-                self.games_played = stats["games_played"]
-                self.total_moves = stats["total_moves"]
-                self.best_time = stats["best_time"]
-                self.player_stats = stats["player_stats"]
-        except (FileNotFoundError, EOFError):
-            self.save_stats()
+        games_played, total_moves, best_time = self.connection.execute(
+            "SELECT games_played, total_moves, best_time FROM summary WHERE id = 1"
+        ).fetchone()
+        self.games_played = games_played
+        self.total_moves = total_moves
+        self.best_time = self.from_db_time(best_time)
+
+    def load_leaderboard(self):
+        # Built once per session; afterwards only the changed player is re-indexed
+        rows = [
+            (name, games_played, total_moves, self.from_db_time(best_time))
+            for name, games_played, total_moves, best_time in self.connection.execute(
+                "SELECT name, games_played, total_moves, best_time FROM players"
+            )
+        ]
+        for name, games_played, total_moves, best_time in rows:
+            self.players[name] = {"games_played": games_played, "total_moves": total_moves, "best_time": best_time}
+        self.leaderboard.load(rows)
 
     def save_stats(self):
-        with open(self.stats_file, "wb") as f:
-            stats = {
-                "games_played": self.games_played,
-                "total_moves": self.total_moves,
-                "best_time": self.best_time,
-                "player_stats": self.player_stats
-            }
-            pickle.dump(stats, f)
+        # Block until every queued change is on disk
+        self.persistence.flush()
+
+    @property
+    def player_stats(self):
+        return {name: dict(player) for name, player in self.players.items()}
+
+    def get_player_stats(self, player_name):
+        player = self.players.get(player_name)
+        return dict(player) if player is not None else None
 
     def update_player_stats(self, player_name, moves, time):
-        if player_name not in self.player_stats:
-            self.player_stats[player_name] = {
-                "games_played": 0,
-                "total_moves": 0,
-                "best_time": float('inf')
-            }
-
-        self.player_stats[player_name]["games_played"] += 1
-        self.player_stats[player_name]["total_moves"] += moves
-        if time < self.player_stats[player_name]["best_time"]:
-            self.player_stats[player_name]["best_time"] = time
-
-        self.save_stats()
+        player = self.players.setdefault(player_name, {"games_played": 0, "total_moves": 0, "best_time": float('inf')})
+        player["games_played"] += 1
+        player["total_moves"] += moves
+        player["best_time"] = min(player["best_time"], time)
+        self.leaderboard.update(player_name, player["games_played"], player["total_moves"], player["best_time"])
+        # Only this game is queued and the writer adds it to whatever the row holds by then,
+        # so processes sharing the database never overwrite each other's games
+        self.persistence.submit(
+            ("players", self.stats_file), self.write_players, {player_name: (1, moves, time)}, merge_deltas,
+        )
+
+    def write_players(self, deltas):
+        # Runs on the write-behind thread, which gets a connection of its own
+        if self.writer_connection is None:
+            self.writer_connection = sqlite3.connect(self.stats_file, check_same_thread=False)
+            self.writer_connection.execute("PRAGMA synchronous=NORMAL")
+        with self.writer_connection:
+            self.writer_connection.executemany(
+                "INSERT INTO players (name, games_played, total_moves, best_time) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET "
+                "games_played = games_played + excluded.games_played, "
+                "total_moves = total_moves + excluded.total_moves, "
+                "best_time = MIN(COALESCE(best_time, excluded.best_time), excluded.best_time)",
+                [
+                    (name, games_played, total_moves, best_time)
+                    for name, (games_played, total_moves, best_time) in deltas.items()
+                ],
+            )
+
+    def close(self):
+        if self.owns_persistence:
+            self.persistence.close()
+        else:
+            self.persistence.flush()
+        if self.writer_connection is not None:
+            self.writer_connection.close()
+        self.connection.close()
@@ -0,0 +1,269 @@
+import random
+from collections import OrderedDict
+
+import pygame
+
+# Tile faces share this many colors, so the atlas stays the same size for any board
+PALETTE_SIZE = 16
+MIN_TILE_SIZE = 4
+MAX_ZOOM = 4.0
+ZOOM_STEP = 1.25
+# Below this size numbers are unreadable and per-tile blits too many, so the board is drawn as
+# one scaled overview image with a pixel per cell
+MIN_LABEL_TILE = 16
+# Past this many visible tiles they are drawn once into a cached layer instead of every frame
+LAYER_MIN_TILES = 64
+# Transparent color of the cached tile layer, so the background shows through the gaps
+LAYER_KEY = (255, 0, 255)
+
+
+class TileAtlas:
+    def __init__(self, palette, tile_size):
+        self.tile_size = tile_size
+        self.surface = pygame.Surface((tile_size * len(palette), tile_size))
+        border = max(1, tile_size // 20)
+        self.rects = []
+        for i, color in enumerate(palette):
+            rect = pygame.Rect(i * tile_size, 0, tile_size, tile_size)
+            self.surface.fill(color, rect)
+            pygame.draw.rect(self.surface, (0, 0, 0), rect, border)
+            self.rects.append(rect)
+        self.surface = self.surface.convert()
+
+
+class DigitGlyphs:
+    def __init__(self, font, color):
+        self.glyphs = [font.render(str(digit), True, color) for digit in range(10)]
+        self.widths = [glyph.get_width() for glyph in self.glyphs]
+        self.height = max(glyph.get_height() for glyph in self.glyphs)
+
+    def label(self, number, center, blits):
+        digits = [int(digit) for digit in str(number)]
+        x = center[0] - sum(self.widths[digit] for digit in digits) // 2
+        y = center[1] - self.height // 2
+        for digit in digits:
+            blits.append((self.glyphs[digit], (x, y)))
+            x += self.widths[digit]
+
+
+class TileView:
+    def __init__(self, rows, cols, tile_size, margin, width, height, font_loader, font_size, text_color, picture=None):
+        self.rows, self.cols = rows, cols
+        self.base_tile_size, self.base_margin = tile_size, margin
+        self.width, self.height = width, height
+        self.font_loader = font_loader
+        self.base_font_size = font_size
+        self.text_color = text_color
+
+        self.palette = [
+            (random.randint(50, 200), random.randint(50, 200), random.randint(50, 200))
+            for _ in range(PALETTE_SIZE)
+        ]
+        # Palette slot of every tile, one byte each (index 0 is the blank)
+        self.tile_colors = bytearray(random.randrange(PALETTE_SIZE) for _ in range(rows * cols))
+
+        # In picture mode every face is scaled from its own slice of the picture, so only the
+        # cached faces exist at screen size and memory does not grow with the board or the zoom
+        self.picture_source = picture
+        self.picture_colors = None
+
+        self.zoom = 0.0
+        self.offset_x = self.offset_y = 0
+        self.set_zoom(1.0)
+
+    def set_zoom(self, zoom, anchor=None):
+        zoom = max(MIN_TILE_SIZE / self.base_tile_size, min(MAX_ZOOM, zoom))
+        if zoom == self.zoom:
+            return False
+        if anchor is None:
+            anchor = (self.width // 2, self.height // 2)
+        # Keep the board point under the anchor where it is on screen
+        board_x = board_y = 0.0
+        if self.zoom:
+            board_x = (anchor[0] - self.origin_x + self.offset_x) / self.pitch
+            board_y = (anchor[1] - self.origin_y + self.offset_y) / self.pitch
+
+        self.zoom = zoom
+        self.tile_size = max(MIN_TILE_SIZE, int(self.base_tile_size * zoom))
+        self.margin = int(self.base_margin * zoom)
+        self.pitch = self.tile_size + self.margin
+        self.board_width = self.cols * self.pitch - self.margin
+        self.board_height = self.rows * self.pitch - self.margin
+        self.origin_x = max(0, (self.width - self.board_width) // 2)
+        self.origin_y = max(0, (self.height - self.board_height) // 2)
+
+        self.atlas = TileAtlas(self.palette, self.tile_size)
+        self.picture = self.picture_source if self.tile_size >= MIN_LABEL_TILE else None
+        self.glyphs = None
+        if self.picture is None and self.tile_size >= MIN_LABEL_TILE:
+            glyphs = DigitGlyphs(self.font_loader(max(6, int(self.base_font_size * zoom))), self.text_color)
+            if glyphs.height <= self.tile_size:
+                self.glyphs = glyphs
+        # Composed faces are cached for about two screens of tiles, however big the board is
+        visible = (self.width // self.pitch + 2) * (self.height // self.pitch + 2)
+        self.face_limit = max(64, 2 * visible)
+        self.faces = OrderedDict()
+        self.overview = None
+        self.overview_scaled = None
+        self.layer = None
+        self.dirty_cells = []
+
+        self.offset_x = int(board_x * self.pitch) - anchor[0] + self.origin_x
+        self.offset_y = int(board_y * self.pitch) - anchor[1] + self.origin_y
+        self.pan(0, 0)
+        return True
+
+    def zoom_in(self, anchor=None):
+        return self.set_zoom(self.zoom * ZOOM_STEP, anchor)
+
+    def zoom_out(self, anchor=None):
+        return self.set_zoom(self.zoom / ZOOM_STEP, anchor)
+
+    def picture_slice(self, tile):
+        width, height = self.picture_source.get_size()
+        row, col = divmod(tile - 1, self.cols)
+        left, right = col * width // self.cols, (col + 1) * width // self.cols
+        top, bottom = row * height // self.rows, (row + 1) * height // self.rows
+        return self.picture_source.subsurface((left, top, max(1, right - left), max(1, bottom - top)))
+
+    def cell_color(self, tile):
+        if self.picture_source is not None:
+            if self.picture_colors is None:
+                self.picture_colors = pygame.transform.smoothscale(self.picture_source, (self.cols, self.rows))
+            row, col = divmod(tile - 1, self.cols)
+            return self.picture_colors.get_at((col, row))
+        return self.palette[self.tile_colors[tile]]
+
+    def overview_color(self, tile):
+        # The blank is left in the transparent key color, which no tile may use
+        if not tile:
+            return LAYER_KEY
+        color = tuple(self.cell_color(tile))[:3]
+        return (254, 0, 255) if color == LAYER_KEY else color
+
+    def face(self, tile):
+        face = self.faces.get(tile)
+        if face is not None:
+            self.faces.move_to_end(tile)
+            return face
+        if self.picture is not None:
+            face = pygame.transform.smoothscale(self.picture_slice(tile), (self.tile_size, self.tile_size))
+        else:
+            face = self.atlas.surface.subsurface(self.atlas.rects[self.tile_colors[tile]]).copy()
+        if self.glyphs is not None:
+            labels = []
+            self.glyphs.label(tile, (self.tile_size // 2, self.tile_size // 2), labels)
+            face.blits(labels, doreturn=False)
+        self.faces[tile] = face
+        if len(self.faces) > self.face_limit:
+            self.faces.popitem(last=False)
+        return face
+
+    def build_overview(self, board):
+        overview = pygame.Surface((self.cols, self.rows))
+        overview.set_colorkey(LAYER_KEY)
+        pixels = pygame.PixelArray(overview)
+        for row in range(self.rows):
+            for col, tile in enumerate(board.cells(row * self.cols, (row + 1) * self.cols)):
+                pixels[col, row] = self.overview_color(tile)
+        del pixels
+        return overview
+
+    def refresh(self, board, *indices):
+        # Moves only touch a couple of cells, so the cached layers are patched rather than rebuilt
+        self.dirty_cells.extend(indices)
+        if self.overview is None:
+            return
+        for index in indices:
+            row, col = divmod(index, self.cols)
+            self.overview.set_at((col, row), self.overview_color(board[index]))
+        self.overview_scaled = None
+
+    def pan(self, dx, dy):
+        offset_x = max(0, min(self.offset_x + dx, self.board_width - self.width))
+        offset_y = max(0, min(self.offset_y + dy, self.board_height - self.height))
+        moved = (offset_x, offset_y) != (self.offset_x, self.offset_y)
+        self.offset_x, self.offset_y = offset_x, offset_y
+        if moved:
+            self.layer = None
+            self.overview_scaled = None
+        return moved
+
+    def cell_position(self, index):
+        row, col = divmod(index, self.cols)
+        return (self.origin_x + col * self.pitch - self.offset_x, self.origin_y + row * self.pitch - self.offset_y)
+
+    def cell_rect(self, index):
+        return pygame.Rect(self.cell_position(index), (self.tile_size, self.tile_size))
+
+    def follow(self, index):
+        # Scroll just enough to bring a cell fully into view
+        rect = self.cell_rect(index)
+        dx = min(0, rect.left) or max(0, rect.right - self.width)
+        dy = min(0, rect.top) or max(0, rect.bottom - self.height)
+        return self.pan(dx, dy)
+
+    def visible_range(self, start, offset, pitch, count, extent):
+        first = max(0, (offset - start) // pitch)
+        last = min(count, (offset + extent - start) // pitch + 1)
+        return first, last
+
+    def visible_cells(self):
+        rows = self.visible_range(self.origin_y, self.offset_y, self.pitch, self.rows, self.height)
+        cols = self.visible_range(self.origin_x, self.offset_x, self.pitch, self.cols, self.width)
+        return rows, cols
+
+    def blit_visible(self, target, board):
+        (first_row, last_row), (first_col, last_col) = self.visible_cells()
+        face = self.face
+        blits = []
+        for row in range(first_row, last_row):
+            start = row * self.cols
+            x, y = self.cell_position(start + first_col)
+            for tile in board.cells(start + first_col, start + last_col):
+                if tile:
+                    blits.append((face(tile), (x, y)))
+                x += self.pitch
+        target.blits(blits, doreturn=False)
+
+    def build_layer(self, board):
+        # Tiles inside the window are drawn once into a layer that is reused until the view moves
+        layer = pygame.Surface((self.width, self.height)).convert()
+        layer.fill(LAYER_KEY)
+        layer.set_colorkey(LAYER_KEY)
+        self.blit_visible(layer, board)
+        return layer
+
+    def draw(self, surface, board):
+        if self.tile_size < MIN_LABEL_TILE:
+            self.draw_overview(surface, board)
+            return
+        (first_row, last_row), (first_col, last_col) = self.visible_cells()
+        if (last_row - first_row) * (last_col - first_col) <= LAYER_MIN_TILES:
+            self.dirty_cells = []
+            self.blit_visible(surface, board)
+            return
+        if self.layer is None:
+            self.layer = self.build_layer(board)
+        elif self.dirty_cells:
+            for index in self.dirty_cells:
+                rect = self.cell_rect(index)
+                self.layer.fill(LAYER_KEY, rect)
+                tile = board[index]
+                if tile:
+                    self.layer.blit(self.face(tile), rect)
+        self.dirty_cells = []
+        surface.blit(self.layer, (0, 0))
+
+    def draw_overview(self, surface, board):
+        if self.overview is None:
+            self.overview = self.build_overview(board)
+        if self.overview_scaled is None:
+            # Only the visible part of the overview is scaled up, so memory follows the window size
+            (first_row, last_row), (first_col, last_col) = self.visible_cells()
+            area = pygame.Rect(first_col, first_row, last_col - first_col, last_row - first_row)
+            self.overview_scaled = pygame.transform.scale(
+                self.overview.subsurface(area), (area.width * self.pitch, area.height * self.pitch)
+            )
+            self.overview_position = self.cell_position(first_row * self.cols + first_col)
+        surface.blit(self.overview_scaled, self.overview_position)
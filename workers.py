@@ -0,0 +1,16 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_pool(max_workers=1):
+    # Workers are spawned rather than forked: the game process runs SDL and several threads,
+    # none of which a forked child should inherit
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def stop_pool(executor):
+    # Cancelling futures cannot stop a call that is already running, and exiting would wait for it
+    processes = list(executor._processes.values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()